@@ -0,0 +1,182 @@
+import threading
+
+from collections import OrderedDict
+
+import pygame
+import settings
+
+from memory import memory, surface_size
+
+"This module contains the asset cache of the Squish game."
+
+
+class AssetCache:
+
+    """
+    A registry that loads every image, font and sound of the game only
+    once and hands out the shared object on every later request.
+    Images are converted to the display format, colorkeyed and scaled
+    when they are loaded, so the sprites and the HUD can blit them
+    directly. Images and sounds are kept in least-recently-used order
+    and evicted when their decoded size exceeds the budget (in bytes).
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.images = OrderedDict()
+        self.sounds = OrderedDict()
+        self.fonts = {}
+        self.size = 0   # Decoded bytes held by images and sounds (not
+                        # counting subsurfaces, which share their pixels)
+        self.loads = 0  # Number of times something was read from disk
+        self.atlas = None  # The texture atlas (see atlas.py), if any
+        # Images and sounds decoded in the background, not yet handed out:
+        self.decoded_images = {}
+        self.decoded_sounds = {}
+
+    def configure(self):
+        """
+        Takes the budget from the settings in use (e.g., when config.py
+        has been reloaded), and evicts whatever no longer fits in it.
+        """
+        self.budget = settings.current.asset_budget
+        self.evict()
+
+    def image(self, name, size=None, colorkey=(255, 255, 255)):
+        """
+        Returns the image in the file name, converted to the display
+        format, scaled to size (if given) and with colorkey as its
+        transparent colour (None for an opaque image).
+        """
+        key = name, size, colorkey
+        image = self.images.get(key)
+        if image is not None:
+            self.images.move_to_end(key)
+            return image
+        if self.atlas is not None and colorkey == (255, 255, 255) and (name, size) in self.atlas:
+            # Already converted, scaled and colorkeyed in the atlas:
+            image = self.atlas.image(name, size)
+        else:
+            image = self.decoded_images.pop(name, None)
+            if image is None:
+                image = pygame.image.load(name)
+                self.loads += 1
+            image = image.convert()
+            if size:
+                image = pygame.transform.scale(image, size)
+            if colorkey is not None:
+                image.set_colorkey(colorkey)
+        self.images[key] = memory.track(image, 'AssetCache')
+        self.size += surface_size(image)
+        self.evict()
+        return image
+
+    def font(self, name, size):
+        """
+        Returns the font in the file name, in the given point size.
+        """
+        key = name, size
+        font = self.fonts.get(key)
+        if font is None:
+            font = self.fonts[key] = pygame.font.Font(name, size)
+            self.loads += 1
+        return font
+
+    def sound(self, name):
+        """
+        Returns the sound in the file name, decoded once into a buffer
+        that may be played any number of times.
+        """
+        sound = self.sounds.get(name)
+        if sound is not None:
+            self.sounds.move_to_end(name)
+            return sound
+        sound = self.decoded_sounds.pop(name, None)
+        if sound is None:
+            sound = pygame.mixer.Sound(name)
+            self.loads += 1
+        self.size += sound_size(sound)
+        self.sounds[name] = memory.track(sound, 'AssetCache', sound_size(sound))
+        self.evict()
+        return sound
+
+    def preload(self, images=(), fonts=(), sounds=()):
+        """
+        Loads the given resources up front (e.g., at startup) so that
+        the first frame that uses them doesn't have to wait for the
+        disk. Images may be given as file names or as argument tuples
+        for the image method; fonts as (name, size) tuples.
+        """
+        for image in images:
+            if isinstance(image, str):
+                image = image,
+            self.image(*image)
+        for font in fonts:
+            self.font(*font)
+        for sound in sounds:
+            self.sound(sound)
+
+    def load_in_background(self, images=(), sounds=()):
+        """
+        Starts reading and decoding the given image and sound files on
+        a background thread, and returns the thread. The main thread
+        only has to convert the images when they are first requested
+        (converting needs the display, so it can't be done up front).
+        Anything requested before the thread gets to it is simply
+        loaded the usual way.
+        """
+        thread = threading.Thread(target=self.decode, args=(list(images), list(sounds)),
+                                  name='asset loader', daemon=True)
+        thread.start()
+        return thread
+
+    def decode(self, images, sounds):
+        for name in images:
+            if not any(key[0] == name for key in list(self.images)):
+                self.decoded_images[name] = pygame.image.load(name)
+        for name in sounds:
+            if name not in self.sounds:
+                self.decoded_sounds[name] = pygame.mixer.Sound(name)
+
+    def evict(self):
+        """
+        Drops the least recently used images and sounds until the cache
+        fits its budget again. The most recently used image and sound
+        are always kept. Sprites that still refer to an evicted surface
+        keep it alive; it will simply be loaded again by the next
+        request.
+        """
+        if self.budget is None:
+            return
+        while self.size > self.budget:
+            if len(self.images) > 1:
+                _, image = self.images.popitem(last=False)
+                self.size -= surface_size(image)
+            elif len(self.sounds) > 1:
+                _, sound = self.sounds.popitem(last=False)
+                self.size -= sound_size(sound)
+            else:
+                break
+
+    def clear(self):
+        """
+        Forgets everything that has been loaded.
+        """
+        self.images.clear()
+        self.sounds.clear()
+        self.fonts.clear()
+        self.decoded_images.clear()
+        self.decoded_sounds.clear()
+        self.size = 0
+
+
+def sound_size(sound):
+    """
+    Returns the number of bytes of the decoded samples of a sound.
+    """
+    frequency, size, channels = pygame.mixer.get_init()
+    return int(sound.get_length() * frequency) * channels * abs(size) // 8
+
+
+# The shared cache used by all the modules of the game:
+assets = AssetCache(settings.current.asset_budget)
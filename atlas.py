@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import sys
+
+import pygame
+import settings
+
+from memory import memory
+
+"This module contains the texture atlas build step of the Squish game."
+
+PADDING = 2  # Pixels of transparent white between the images
+
+
+class Atlas:
+
+    """
+    All the sprite images of the game in one surface, so they are read
+    and decoded from a single file. The surface is converted to the
+    display format once, and every image is copied out of it into a
+    surface of its own, colorkeyed (white) with RLE acceleration:
+    subsurfaces would share the pixels, but SDL only RLE-encodes a
+    surface that is blitted itself, not its subsurfaces, and the
+    encoded images blit several times faster.
+    """
+
+    def __init__(self, surface, rects):
+        self.surface = surface
+        self.rects = rects
+        self.converted = None
+
+    def __contains__(self, source):
+        return key(*source) in self.rects
+
+    def image(self, name, size=None):
+        """
+        Returns the image in the file name, scaled to size (which must
+        be the size it was packed in).
+        """
+        if self.converted is None:
+            self.converted = memory.track(self.surface.convert(), 'Atlas')
+        image = self.converted.subsurface(self.rects[key(name, size)]).copy()
+        image.set_colorkey((255, 255, 255), pygame.RLEACCEL)
+        return image
+
+
+def sources():
+    """
+    Returns the images packed into the atlas, with the size they are
+    scaled to (if any), as the settings in use name them. The splash
+    image is too big to be worth it, and is only shown on the paused
+    screens.
+    """
+    config = settings.current
+    return [(config.banana_image, None), (config.weight16_image, None),
+            (config.weight8_image, None), (config.egg_image, None),
+            (config.basket_image, None), (config.healthbar_image, (25, 25))]
+
+
+def key(name, size):
+    """
+    Returns the name of an image (scaled to size) in the atlas index.
+    """
+    return '{}@{}x{}'.format(name, *size) if size else name
+
+
+def hashes():
+    """
+    Returns the SHA-1 hashes of the source images, by file name.
+    """
+    result = {}
+    for name, _ in sources():
+        with open(name, 'rb') as file:
+            result[name] = hashlib.sha1(file.read()).hexdigest()
+    return result
+
+
+def pack(sizes, width):
+    """
+    Places rectangles of the given sizes on shelves (rows) no wider
+    than width, tallest first. Returns their (x, y) positions and the
+    total height.
+    """
+    order = sorted(range(len(sizes)), key=lambda i: -sizes[i][1])
+    positions = [None] * len(sizes)
+    x = y = shelf = 0
+    for i in order:
+        w, h = sizes[i]
+        if x and x + w > width:
+            x, y, shelf = 0, y + shelf + PADDING, 0
+        positions[i] = x, y
+        x += w + PADDING
+        shelf = max(shelf, h)
+    return positions, y + shelf
+
+
+def build(directory=None, width=512):
+    """
+    Packs the source images into one atlas, and saves it as atlas.png
+    in the directory (by default config.atlas_dir), with an index
+    (atlas.json) of the rect of each image and the hashes of the
+    source files it was built from.
+    """
+    directory = directory or settings.current.atlas_dir
+    # The images are converted to plain 24-bit RGB (dropping any alpha)
+    # just like they are when loaded one by one:
+    images = []
+    for name, size in sources():
+        image = pygame.image.load(name).convert(24, 0)
+        images.append(pygame.transform.scale(image, size) if size else image)
+    sizes = [image.get_size() for image in images]
+    positions, height = pack(sizes, max(width, max(w for w, _ in sizes)))
+    surface = pygame.Surface((max(x + w for (x, _), (w, _) in zip(positions, sizes)), height), 0, 24)
+    surface.fill((255, 255, 255))
+    for image, position in zip(images, positions):
+        surface.blit(image, position)
+    os.makedirs(directory, exist_ok=True)
+    pygame.image.save(surface, os.path.join(directory, 'atlas.png'))
+    index = {
+        'rects': {key(*source): list(position + size)
+                  for source, position, size in zip(sources(), positions, sizes)},
+        'hashes': hashes(),
+    }
+    with open(os.path.join(directory, 'atlas.json'), 'w') as file:
+        json.dump(index, file, indent=2, sort_keys=True)
+    return Atlas(surface, index['rects'])
+
+
+def load(directory=None):
+    """
+    Returns the atlas saved in the directory (by default
+    config.atlas_dir), building it first if it is missing or if any
+    source image has changed since it was built. Returns None if it
+    can't be built (e.g., in a read-only installation).
+    """
+    directory = directory or settings.current.atlas_dir
+    try:
+        with open(os.path.join(directory, 'atlas.json')) as file:
+            index = json.load(file)
+        if index['hashes'] == hashes():
+            surface = pygame.image.load(os.path.join(directory, 'atlas.png'))
+            return Atlas(surface, index['rects'])
+    except (OSError, ValueError, KeyError, pygame.error):
+        pass
+    try:
+        return build(directory)
+    except (OSError, pygame.error):
+        return None
+
+
+if __name__ == '__main__':
+    # Build (or rebuild) the atlas, e.g. before bundling the game. The
+    # images can only be converted with a display, so open a hidden one:
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    pygame.display.init()
+    pygame.display.set_mode((1, 1), pygame.HIDDEN)
+    atlas = build(*sys.argv[1:])
+    print('Packed {} images into {}x{} pixels'.format(len(atlas.rects), *atlas.surface.get_size()))
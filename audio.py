@@ -0,0 +1,75 @@
+import time
+
+import pygame
+import settings
+
+from assets import assets
+
+"This module contains the sound manager of the Squish game."
+
+
+class Audio:
+
+    """
+    Plays the sounds of the game on a fixed pool of mixer channels
+    reserved for it. Each sound is decoded only once (by the asset
+    cache), at most max_instances copies of the same sound play at a
+    time, and when all channels are busy the one that has played the
+    longest is taken over. Playing a sound only starts it on a channel,
+    so it never holds up the game loop.
+    """
+
+    def __init__(self, channels=8, max_instances=2):
+        self.size = channels
+        self.max_instances = max_instances
+        self.channels = []
+        self.playing = []  # (sound name, start time) for each channel
+
+    def init(self):
+        """
+        Reserves the channels. Must be called after pygame.mixer.init;
+        until then (or without a sound card) nothing is played.
+        """
+        if not pygame.mixer.get_init():
+            return
+        if pygame.mixer.get_num_channels() < self.size:
+            pygame.mixer.set_num_channels(self.size)
+        pygame.mixer.set_reserved(self.size)
+        self.channels = [pygame.mixer.Channel(i) for i in range(self.size)]
+        self.playing = [(None, 0.0)] * self.size
+
+    def configure(self):
+        """
+        Reserves as many channels, and allows as many copies of a
+        sound, as the settings in use say (e.g., when config.py has
+        been reloaded).
+        """
+        self.size = settings.current.sound_channels
+        self.max_instances = settings.current.sound_instances
+        self.init()
+
+    def play(self, name):
+        """
+        Plays the sound in the file name, unless too many copies of it
+        are playing already.
+        """
+        if not self.channels:
+            return
+        free = None
+        instances = 0
+        for i, channel in enumerate(self.channels):
+            if channel.get_busy():
+                if self.playing[i][0] == name:
+                    instances += 1
+            elif free is None:
+                free = i
+        if instances >= self.max_instances:
+            return
+        if free is None:
+            free = min(range(self.size), key=lambda i: self.playing[i][1])
+        self.channels[free].play(assets.sound(name))
+        self.playing[free] = name, time.perf_counter()
+
+
+# The sound manager shared by all the states:
+audio = Audio(settings.current.sound_channels, settings.current.sound_instances)
@@ -0,0 +1,163 @@
+import argparse
+import json
+import random
+import sys
+import time
+
+import sim  # First, so the game runs on SDL's dummy drivers
+import present
+import pygame
+import settings
+import squish
+import swarm
+
+from present import presenter
+
+"This module contains the performance benchmarks of the Squish game."
+
+# The screen sizes and numbers of eggs (or swarm objects) swept over:
+SCREEN_SIZES = [(640, 480), (1024, 768), (1920, 1080)]
+EGG_NUMBERS = [1, 5, 50, 500]
+SWARM_SIZES = [1000, 5000]
+
+
+class Dummy:
+    """
+    Stands in for the Game object the states tell about the next state.
+    """
+    next_state = None
+
+
+def time_state(state, screen, ticks):
+    """
+    Displays state for the first time, and then runs it for the given
+    number of ticks, updating and displaying it once per tick. Levels
+    are updated through their step method, with the catcher sweeping
+    across the screen. Returns the time (in microseconds) of the first
+    display and the mean times spent in updating and in displaying.
+    """
+    game = Dummy()
+    clock = time.perf_counter
+    start = clock()
+    state.first_display(screen)
+    first = clock() - start
+    dt = settings.current.dt
+    width = screen.get_width()
+    level = isinstance(state, squish.Level)
+    update = display = 0.0
+    for tick in range(ticks):
+        start = clock()
+        if level:
+            state.step(tick * 7 % width, dt)
+        else:
+            state.update(game)
+        middle = clock()
+        state.interpolate(0.5)
+        state.display(screen)
+        update += middle - start
+        display += clock() - middle
+    state.leave()
+    return {'first_display_us': first * 1e6,
+            'update_us': update / ticks * 1e6,
+            'display_us': display / ticks * 1e6}
+
+
+def cases():
+    """
+    Generates (name, state factory, screen size, config overrides) for
+    every benchmark.
+    """
+    size = tuple(settings.current.screen_size)
+    yield 'StartUp', squish.StartUp, size, {}
+    yield 'Banana_StartUp', squish.Banana_StartUp, size, {}
+    yield 'Banana_Info', squish.Banana_Info, size, {}
+    yield 'LevelCleared', lambda: squish.LevelCleared(0, 1, 0), size, {}
+    yield 'GameOver', lambda: squish.GameOver(0), size, {}
+    for screen_size in SCREEN_SIZES:
+        name = '{}x{}'.format(*screen_size)
+        yield 'BananaLevel/' + name, squish.BananaLevel, screen_size, {}
+        for eggs in EGG_NUMBERS:
+            yield 'BasketLevel/eggs={}/{}'.format(eggs, name), squish.BasketLevel, screen_size, {'egg_number': eggs}
+        if swarm.numpy is not None:
+            for count in SWARM_SIZES:
+                yield 'SwarmLevel/objects={}/{}'.format(count, name), squish.SwarmLevel, screen_size, {'swarm_size': count}
+
+
+def run(ticks, repeat, only=None, backend='surface'):
+    """
+    Runs all the benchmarks (or those whose names contain only), each
+    repeat times, and returns the best times of each. The states draw
+    with the given render backend (see present.py).
+    """
+    sim.init()
+    pygame.font.init()
+    pygame.mixer.init()
+    results = {}
+    for name, factory, size, overrides in cases():
+        if only and only not in name:
+            continue
+        saved = settings.current
+        settings.use(saved.replace(screen_size=size, **overrides))
+        screen = presenter.open(size, backend=backend)
+        try:
+            best = None
+            for _ in range(repeat):
+                random.seed(0)
+                times = time_state(factory(), screen, ticks)
+                if best is None:
+                    best = times
+                else:
+                    best = {key: min(best[key], times[key]) for key in best}
+        finally:
+            settings.use(saved)
+        results[name] = best
+        print('{:40} first display {:9.1f} us  update {:9.1f} us  display {:9.1f} us'.format(
+            name, best['first_display_us'], best['update_us'], best['display_us']))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares results with a baseline, and returns the list of
+    regressions: times more than threshold (e.g., 0.2 for 20%) slower
+    than in the baseline.
+    """
+    regressions = []
+    for name, times in sorted(results.items()):
+        for key, value in times.items():
+            old = baseline.get(name, {}).get(key)
+            if old and value > old * (1 + threshold):
+                regressions.append('{} {}: {:.1f} us -> {:.1f} us ({:+.0%})'.format(
+                    name, key, old, value, value / old - 1))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Squish game states headlessly.')
+    parser.add_argument('--ticks', type=int, default=500, help='ticks to run each state for')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each state (the best one counts)')
+    parser.add_argument('--only', help='only run the benchmarks whose names contain this')
+    parser.add_argument('--backend', choices=present.BACKENDS, default='surface',
+                        help='render backend to draw with (default: surface)')
+    parser.add_argument('--save', metavar='FILE', help='store the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='fail if slower than this JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown before failing (default 0.2, i.e. 20%%)')
+    options = parser.parse_args(args)
+
+    results = run(options.ticks, options.repeat, options.only, options.backend)
+    if options.save:
+        with open(options.save, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    if options.compare:
+        with open(options.compare) as file:
+            regressions = compare(results, json.load(file), options.threshold)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,7 +3,8 @@
 
 # Feel free to modify the configuration variables below to taste.
 # If the game is too fast or too slow, try to modify the speed
-# variables.
+# variables. The file is read again (between levels) when it is saved
+# while the game runs; the settings are checked by settings.py.
 
 # Images in the game:
 banana_image = 'banana.png'
@@ -16,6 +17,10 @@ egg_image = 'egg.png'
 
 font_path = 'font.ttf'
 
+# Where the texture atlas of the sprite images is cached (see atlas.py;
+# empty to load the images one by one):
+atlas_dir = 'atlas'
+
 # General appearance:
 screen_size = 1024, 768
 background_color = 255, 255, 255
@@ -28,26 +33,89 @@ score_x = 60
 score_y = 20
 life_x = 850
 life_y = 20
+# How many rendered score texts the HUD keeps around:
+hud_cache_size = 32
 btn1_color = 255, 0, 0  # red
 btn2_color = 0, 255, 0  # green
 btn1_pos_size = 300, 500, 100, 50
 btn2_pos_size = 600, 500, 100, 50
+# Only redraw and update the parts of the screen that change during
+# a level (set to 0 to redraw the whole screen every frame):
+dirty_rects = 1
+# Draw the game at screen_size and scale it to the window (or, in full
+# screen mode, the whole display) in one step per frame, so drawing
+# costs the same on any display: 'smooth', 'nearest' (neighbour) or
+# 'integer' (nearest, by whole factors only), or '' to draw straight to
+# the window. window_size is the size of the window (0 for screen_size
+# in a window, and the size of the display in full screen mode):
+scale_mode = ''
+window_size = 0
+# Draw with 'surface' blits, or with an SDL 'renderer' (on the GPU
+# where there is one; set SDL_RENDER_DRIVER=software to test without):
+render_backend = 'surface'
 
 # These affect the behavior of the game:
-drop_speed = 1
+drop_speed = 240      # Pixels per second
 banana_speed = 10
-speed_increase = 1
+speed_increase = 240  # Pixels per second, for each level
 weights_per_level = 10
 banana_pad_top = 10
 banana_pad_side = 10
 basket_pad_top = 5
 basket_pad_side = 5
+# Test collisions pixel for pixel (with masks of the images), instead of
+# against the rects of the images less the paddings above:
+pixel_collisions = 1
 score_for_weight16 = 2
 score_for_weight8 = 1
-FPS = 240
+FPS = 60          # Frames drawn per second (at most)
+tick_rate = 240   # Updates of the game logic per second (at most 65535), at any frame rate
+idle_timeout = 500  # Milliseconds menus and pauses may sleep between events
+
+# Frame profiling: record the time spent in each part of every frame
+# (F3 shows an overlay), and save the last profile_history frames as
+# profile_output + .csv, .json and .trace.json (Chrome trace) on exit.
+# report_startup prints the time from startup to the first frame, and
+# report_latency the percentiles of the time from reading the mouse to
+# presenting a frame (over the last profile_history frames) on exit:
+profile = 0
+report_startup = 1
+report_latency = 0
+profile_history = 600
+profile_output = 'profile'
+
+# Record every session to this file, for replay.py to play again
+# (empty to record nothing). The random seed is drawn from the system
+# unless record_seed is set (to a number from 0 to 2**64 - 1):
+record = ''
+record_seed = None
 egg_number = 5
+# Width (in pixels) of the columns falling objects are sorted into for
+# finding the ones that may touch the banana or basket:
+grid_cell_size = 64
+
+# Swarm mode turns basket mode into an event level with this many eggs
+# and weights (this fraction of them weights) falling at once. It needs
+# NumPy; 0 turns it off. The level is cleared after swarm_catches eggs:
+swarm_size = 0
+swarm_weights = 0.2
+swarm_catches = 100
+
+# Keep the score and length of every level played in this directory
+# (read when the game starts; empty to keep nothing), and show the
+# high_scores best games of each mode on the menu:
+scores_dir = 'scores'
+high_scores = 5
+
+# Upper bound (in bytes) for the decoded images and sounds kept in
+# the asset cache; the least recently used ones are dropped first:
+asset_budget = 32 * 1024 * 1024
 
 # Sounds in the game:
 crash_sound = 'crash.wav'
 fail_sound = 'fail.wav'
 level_up_sound = 'levelup.wav'
+# Mixer channels reserved for these sounds, and how many copies of the
+# same sound may play at once:
+sound_channels = 8
+sound_instances = 2
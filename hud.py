@@ -0,0 +1,136 @@
+from collections import OrderedDict
+
+import pygame
+import settings
+
+from assets import assets
+from memory import memory
+
+"This module contains the heads-up display (score and lives) of the Squish game."
+
+
+class Hud:
+
+    """
+    Shows the score and the lives left during a level. The rendered
+    score texts are kept in a small least-recently-used cache (keyed
+    on the value), and the life bar is composed once for each number
+    of lives, so nothing is rendered while the values stay the same.
+    """
+
+    def __init__(self, cache_size=32):
+        self.cache_size = cache_size
+        self.scores = OrderedDict()  # Rendered "Score:N" texts by N
+        self.bars = {}               # Composed life bars by number of lives
+        self.hits = 0
+        self.misses = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets what is shown on the screen, e.g., when a new level
+        has wiped it. The next update will draw everything.
+        """
+        self.shown = None  # The (score, lives) currently shown
+        self.rects = []    # Where they are shown
+
+    def clear(self):
+        """
+        Drops the rendered score texts and life bars, e.g., when the
+        settings they were drawn with have changed.
+        """
+        self.scores.clear()
+        self.bars.clear()
+        self.reset()
+
+    def configure(self):
+        """
+        Takes the cache size from the settings in use, and drops what
+        was rendered with the old ones (e.g., when config.py has been
+        reloaded).
+        """
+        self.cache_size = settings.current.hud_cache_size
+        self.clear()
+
+    @property
+    def hit_rate(self):
+        """
+        The fraction of score texts and life bars that were found in
+        the caches instead of being rendered.
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def score_image(self, score):
+        """
+        Returns the rendered "Score:N" text for the given score.
+        """
+        image = self.scores.get(score)
+        if image is not None:
+            self.hits += 1
+            self.scores.move_to_end(score)
+            return image
+        self.misses += 1
+        font = assets.font(settings.current.font_path, settings.current.score_font_size)
+        image = font.render("Score:" + str(score), True, settings.current.font_color)
+        self.scores[score] = memory.track(image, 'Hud')
+        if len(self.scores) > self.cache_size:
+            self.scores.popitem(last=False)
+        return image
+
+    def lives_image(self, lives):
+        """
+        Returns a life bar with one healthbar icon (spaced 30 pixels
+        apart) for each life left, or None if there are none left.
+        """
+        if lives <= 0:
+            return None
+        image = self.bars.get(lives)
+        if image is not None:
+            self.hits += 1
+            return image
+        self.misses += 1
+        icon = assets.image(settings.current.healthbar_image, (25, 25))
+        width, height = icon.get_size()
+        image = pygame.Surface((30 * (lives - 1) + width, height)).convert()
+        image.fill((255, 255, 255))
+        for i in range(lives):
+            image.blit(icon, (30 * i, 0))
+        image.set_colorkey((255, 255, 255))  # Transparent background colour (white here)
+        self.bars[lives] = memory.track(image, 'Hud')
+        return image
+
+    def draw(self, surf, score, lives):
+        """
+        Draws the score (centered below config.score_x, config.score_y)
+        and the life bar (starting at config.life_x, config.life_y) on
+        surf, and returns the rects they cover.
+        """
+        config = settings.current
+        text = self.score_image(score)
+        rect = text.get_rect(midtop=(config.score_x, config.score_y))
+        rects = [surf.blit(text, rect)]
+        bar = self.lives_image(lives)
+        if bar is not None:
+            rects.append(surf.blit(bar, (config.life_x, config.life_y)))
+        return rects
+
+    def update(self, surf, score, lives):
+        """
+        Redraws the score and lives on surf if they have changed since
+        the last update, wiping the old ones with the background
+        color first. Returns the rects that have changed (none if the
+        values are the same).
+        """
+        if self.shown == (score, lives):
+            return []
+        for rect in self.rects:
+            surf.fill(settings.current.background_color, rect)
+        changed = self.rects
+        self.rects = self.draw(surf, score, lives)
+        self.shown = score, lives
+        return changed + self.rects
+
+
+# The HUD shared by all the levels (so its caches survive them):
+hud = Hud(settings.current.hud_cache_size)
@@ -0,0 +1,96 @@
+import time
+
+from collections import deque
+
+import pygame
+import settings
+
+from pygame.locals import KEYDOWN, MOUSEBUTTONDOWN, QUIT, VIDEOEXPOSE, WINDOWEXPOSED, WINDOWRESTORED, WINDOWSHOWN
+
+from present import presenter
+
+"This module contains the input stage of the Squish game."
+
+# The events after which the window has to be painted again (see
+# Presenter.repaint), since the states that aren't animated only
+# present a frame when they change:
+EXPOSE = [VIDEOEXPOSE, WINDOWEXPOSED, WINDOWSHOWN, WINDOWRESTORED]
+# The only events the game handles. Everything else (mouse motion
+# above all, which a gaming mouse sends up to 1000 times per second)
+# is dropped by SDL before it reaches the queue:
+EVENTS = [QUIT, KEYDOWN, MOUSEBUTTONDOWN] + EXPOSE
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Input:
+
+    """
+    The input stage of the main loop. The event queue only takes the
+    events the states handle (see EVENTS); SDL still tracks the pointer
+    without the motion events. The pointer is sampled right before each
+    tick, from freshly pumped events, and handed to the states (see
+    Game.pointer), so the last tick before a frame is drawn has where
+    the pointer was just then, rather than where it was when the queue
+    was emptied at the start of the frame.
+
+    For every frame that shows a sampled pointer, the time from the
+    sample to the frame being presented is kept (for the last history
+    frames), for the input latency percentiles.
+    """
+
+    def __init__(self, history=600):
+        self.pointer = 0, 0
+        self.sampled = None  # When the pointer on the screen was sampled
+        self.latency = None  # Of the last frame presented
+        self.latencies = deque(maxlen=history)
+
+    def filter(self):
+        """
+        Lets only the events in EVENTS into the queue.
+        """
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(EVENTS)
+
+    def sample(self):
+        """
+        Pumps the events SDL has received, and returns the pointer
+        position on the screen the states draw on.
+        """
+        pygame.event.pump()
+        self.pointer = presenter.mouse_pos()
+        self.sampled = time.perf_counter()
+        return self.pointer
+
+    def reset(self):
+        """
+        Forgets the last sample, e.g., when a state that doesn't use
+        the pointer takes over.
+        """
+        self.sampled = self.latency = None
+
+    def presented(self):
+        """
+        Records the latency of the frame that has just been presented,
+        if it shows a sampled pointer.
+        """
+        if self.sampled is not None:
+            self.latency = time.perf_counter() - self.sampled
+            self.latencies.append(self.latency)
+
+    def percentiles(self, fractions=(0.5, 0.95, 0.99)):
+        """
+        Returns the given percentiles of the recorded latencies (in
+        milliseconds).
+        """
+        latencies = list(self.latencies)
+        return [percentile(latencies, fraction) * 1000 for fraction in fractions]
+
+
+# The input stage of the game:
+inputs = Input(settings.current.profile_history)
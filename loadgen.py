@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import sys
+import time
+
+import sweep
+
+from inputs import percentile
+from server import FULL, HEADER, HELLO, INPUT, OBJECT, OVER
+
+"This module contains the load generator for the Squish game server."
+
+
+class Stats:
+
+    """
+    What the clients of a load test have received, all together.
+    """
+
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.frames = 0
+        self.bytes = 0
+        self.games = 0   # Games that have ended
+        self.gaps = []   # Seconds between the frames of each client
+
+
+async def client(host, port, mode, seed, player, stats, delay):
+    """
+    Plays one game after another on the server as a thin client: keeps
+    the object positions up to date from the frames it receives, and
+    answers each frame with the x position the player chooses.
+    """
+    await asyncio.sleep(delay)
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        stats.failed += 1
+        return
+    stats.connected += 1
+    play = sweep.PLAYERS[player](mode, seed)
+    positions = []
+    last = None
+    try:
+        writer.write(HELLO.pack(mode, seed))
+        while True:
+            header = await reader.readexactly(HEADER.size)
+            _, x, score, lives, number, flags, count = HEADER.unpack(header)
+            body = await reader.readexactly(count * OBJECT.size)
+            if flags & FULL:
+                positions = [None] * count
+            for i, px, py in OBJECT.iter_unpack(body):
+                positions[i] = px, py
+            now = time.perf_counter()
+            if last is not None:
+                stats.gaps.append(now - last)
+            last = now
+            stats.frames += 1
+            stats.bytes += len(header) + len(body)
+            if flags & OVER:
+                stats.games += 1
+            writer.write(INPUT.pack(play((x, positions, score, lives, number))))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def run(host, port, clients, mode, player, seed, seconds, ramp):
+    """
+    Connects the given number of clients (spread over ramp seconds),
+    lets them play for the given number of seconds, and returns their
+    Stats.
+    """
+    stats = Stats()
+    tasks = [asyncio.ensure_future(client(host, port, mode, seed + i, player, stats, ramp * i / clients))
+             for i in range(clients)]
+    await asyncio.sleep(ramp + seconds)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return stats
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Load test a Squish game server with many clients.')
+    parser.add_argument('--host', default='127.0.0.1', help='address of the server (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=7777, help='port of the server (default: 7777)')
+    parser.add_argument('--clients', type=int, default=100, help='number of clients')
+    parser.add_argument('--mode', type=int, default=0, help='game mode to play (default: 0)')
+    parser.add_argument('--player', choices=sorted(sweep.PLAYERS), default='scripted',
+                        help='how the clients play (default: scripted)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first client\'s games')
+    parser.add_argument('--seconds', type=float, default=10, help='how long to play once all are connected')
+    parser.add_argument('--ramp', type=float, default=1, help='seconds over which to connect the clients')
+    options = parser.parse_args(args)
+
+    stats = asyncio.run(run(options.host, options.port, options.clients, options.mode, options.player,
+                            options.seed, options.seconds, options.ramp))
+    elapsed = options.ramp + options.seconds
+    print('{} clients connected, {} failed'.format(stats.connected, stats.failed))
+    print('{:.0f} frames/s ({:.1f} per client), {:.1f} KB/s, {:.1f} bytes/frame'.format(
+        stats.frames / elapsed, stats.frames / elapsed / max(stats.connected, 1),
+        stats.bytes / elapsed / 1024, stats.bytes / max(stats.frames, 1)))
+    print('{} games ended'.format(stats.games))
+    print('frame gaps: p50 {:.1f} ms  p95 {:.1f} ms  p99 {:.1f} ms  max {:.1f} ms'.format(
+        *(percentile(stats.gaps, fraction) * 1000 for fraction in (0.5, 0.95, 0.99, 1.0))))
+    return 1 if stats.failed or not stats.frames else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
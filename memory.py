@@ -0,0 +1,59 @@
+import weakref
+
+import pygame
+
+"This module contains the memory accounting of the Squish game."
+
+
+def surface_size(surface):
+    """
+    Returns the number of bytes of the pixels of a surface (none for a
+    subsurface, which shares the pixels of its parent).
+    """
+    if surface.get_parent() is not None:
+        return 0
+    return surface.get_pitch() * surface.get_height()
+
+
+class Ledger:
+
+    """
+    Keeps track of the live Surfaces and Sounds of the game (and of
+    other objects worth counting, such as the sprites), with their
+    sizes in bytes, by owner: the class of the state or object that
+    made them, or the kind of sprite. Only weak references are kept,
+    so an object drops out of the ledger as soon as nothing else
+    holds it, and whatever is still in it is really alive.
+    """
+
+    def __init__(self):
+        self.live = weakref.WeakKeyDictionary()  # (owner, bytes) by object
+        self.tracked = 0  # Objects tracked so far
+
+    def track(self, obj, owner, size=None):
+        """
+        Tracks obj for the given owner, and returns it. The size of a
+        Surface is worked out if it isn't given; anything else counts
+        for no bytes unless it is.
+        """
+        if size is None:
+            size = surface_size(obj) if isinstance(obj, pygame.Surface) else 0
+        self.live[obj] = owner, size
+        self.tracked += 1
+        return obj
+
+    def totals(self):
+        """
+        Returns the number and total size of the live objects of each
+        owner, as a dict of [count, bytes] lists.
+        """
+        totals = {}
+        for owner, size in list(self.live.values()):
+            total = totals.setdefault(owner, [0, 0])
+            total[0] += 1
+            total[1] += size
+        return totals
+
+
+# The ledger shared by all the modules of the game:
+memory = Ledger()
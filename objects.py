@@ -1,10 +1,30 @@
-from random import randrange
+import random
 
-import config
 import pygame
+import settings
+
+from assets import assets
+from memory import memory
+from present import presenter
+from profiler import counters
 
 "This module contains the game objects of the Squish game."
 
+masks = {}  # Collision masks of the images, by file name
+
+
+def mask(name):
+    """
+    Returns the collision mask of the image in the file name: its
+    pixels that are not the (white) colorkey. It is built once, and
+    shared by all the sprites with that image.
+    """
+    result = masks.get(name)
+    if result is None:
+        result = masks[name] = pygame.mask.from_surface(assets.image(name))
+        counters.masks += 1
+    return result
+
 
 class SquishSprite(pygame.sprite.Sprite):
 
@@ -12,86 +32,131 @@ class SquishSprite(pygame.sprite.Sprite):
     Generic superclass for all sprites in Squish. The constructor
     takes care of loading an image, setting up the sprite rect, and
     the area within which it is allowed to move. That area is governed
-    by the screen size and the margin.
+    by the screen size and the margin, and is worked out once for all
+    sprites (see settings.py).
     """
 
     def __init__(self, image):
         super().__init__()
-        self.image = pygame.image.load(image).convert()
-        self.image.set_colorkey((255, 255, 255))  # Transparent background colour (white here)
+        # The image is shared by all sprites of a kind (loaded, converted
+        # and colorkeyed with white as the transparent colour only once):
+        self.image = assets.image(image)
         self.rect = self.image.get_rect()
-        screen = pygame.display.get_surface()
-        shrink = -config.margin * 2
-        self.area = screen.get_rect().inflate(shrink, shrink)
+        self.mask = mask(image)
+        self.area = settings.current.area
+        memory.track(self, type(self).__name__)
+
+    def overlaps(self, other):
+        """
+        Determines whether the sprite touches another sprite pixel for
+        pixel. Their masks are only compared if their rects overlap.
+        """
+        rect = self.rect
+        other_rect = other.rect
+        if not rect.colliderect(other_rect):
+            return False
+        counters.mask_tests += 1
+        offset = other_rect.left - rect.left, other_rect.top - rect.top
+        return self.mask.overlap(other.mask, offset) is not None
 
 
-class Weight1(SquishSprite):
+class Kind:
 
     """
-    A falling weight. It uses the SquishSprite constructor to set up
-    its weight image, and will fall with a speed given as a parameter
-    to its constructor.
+    A kind of falling object: the config.py setting that names its
+    image, how much faster than the speed of the level it falls (in
+    pixels per second), how far above the screen it may appear, and how
+    many lives it costs when it hits the catcher. Each kind is a row of
+    the KINDS table, which is all it takes to add a new one.
     """
 
-    def __init__(self, speed):
-        super().__init__(config.weight16_image)
-        self.landed = None
-        self.speed = speed
-        self.reset()
+    __slots__ = ('name', 'setting', 'image', 'offset', 'spawn', 'damage')
 
-    def reset(self):
-        """
-        Move the weight to the top of the screen (just out of sight)
-        and place it at a random horizontal position.
-        """
-        x = randrange(self.area.left, self.area.right)
-        self.rect.midbottom = x, 0 - randrange(0, 300)
+    def __init__(self, name, setting, offset, spawn, damage):
+        self.name = name
+        self.setting = setting
+        self.image = getattr(settings.current, setting)
+        self.offset = offset
+        self.spawn = spawn
+        self.damage = damage
 
-    def update(self):
-        """
-        Move the weight vertically (downwards) a distance
-        corresponding to its speed. Also set the landed attribute
-        according to whether it has reached the bottom of the screen.
-        """
 
-        # Add a delay for each update to adapt to the player's reaction time,
-        # and get the optimal value of 0.002 seconds after parameterization.
-        self.rect.top += self.speed + 2
-        self.landed = self.rect.top >= self.area.bottom
+# The kinds of falling objects, by name:
+KINDS = {kind.name: kind for kind in [
+    Kind('weight16', 'weight16_image', 480, 300, 2),
+    Kind('weight8', 'weight8_image', 240, 300, 1),
+    Kind('egg', 'egg_image', 0, 1000, 0),
+]}
 
 
-class Weight2(SquishSprite):
+def configure():
+    """
+    Gives the kinds the images the settings in use name, e.g., when
+    config.py has been reloaded.
+    """
+    for kind in KINDS.values():
+        kind.image = getattr(settings.current, kind.setting)
+
+
+class Falling(SquishSprite):
 
     """
-    A falling weight. It uses the SquishSprite constructor to set up
-    its weight image, and will fall with a speed given as a parameter
-    to its constructor.
+    A falling object (a weight or an egg) of the given kind, which
+    falls with a speed (in pixels per second) given as a parameter to
+    its constructor, plus the speed offset of its kind. The random
+    positions are drawn from rng (the random module, or a seeded
+    random.Random for reproducible games). The image and the play area
+    are shared by all the objects of a kind, and the attributes are
+    kept in slots, so there are no per-object dicts beyond the one
+    pygame's Sprite keeps its groups in.
     """
 
-    def __init__(self, speed):
-        super().__init__(config.weight8_image)
+    __slots__ = ('kind', 'image', 'rect', 'mask', 'area', 'speed', 'rng', 'y', 'prev_y', 'landed')
+
+    def __init__(self, kind, speed, rng=random):
+        super().__init__(kind.image)
+        self.kind = kind
+        memory.track(self, kind.name)
+        self.landed = None
+        self.speed = speed + kind.offset
+        self.rng = rng
+        self.reset()
+
+    def reuse(self, kind, speed, rng=random):
+        """
+        Readies an object left over from an earlier level (see pool.py)
+        for a new level, as the given kind and with a new speed.
+        """
+        if kind is not self.kind:
+            self.kind = kind
+            self.image = assets.image(kind.image)
+            self.rect = self.image.get_rect()
+            self.mask = mask(kind.image)
+            memory.track(self, kind.name)
+        self.area = settings.current.area
         self.landed = None
-        self.speed = speed
+        self.speed = speed + kind.offset
+        self.rng = rng
         self.reset()
 
     def reset(self):
         """
-        Move the weight to the top of the screen (just out of sight)
+        Move the object to the top of the screen (just out of sight)
         and place it at a random horizontal position.
         """
-        x = randrange(self.area.left, self.area.right)
-        self.rect.midbottom = x, 0 - randrange(0, 300)
+        x = self.rng.randrange(self.area.left, self.area.right)
+        self.rect.midbottom = x, 0 - self.rng.randrange(0, self.kind.spawn)
+        self.y = self.prev_y = self.rect.top
 
-    def update(self):
+    def update(self, dt):
         """
-        Move the weight vertically (downwards) a distance
-        corresponding to its speed. Also set the landed attribute
+        Move the object vertically (downwards) the distance it falls
+        in dt seconds at its speed. Also set the landed attribute
         according to whether it has reached the bottom of the screen.
         """
-
-        # Add a delay for each update to adapt to the player's reaction time,
-        # and get the optimal value of 0.002 seconds after parameterization.
-        self.rect.top += self.speed + 1
+        self.prev_y = self.y
+        self.y += self.speed * dt
+        self.rect.top = round(self.y)
         self.landed = self.rect.top >= self.area.bottom
 
 
@@ -105,67 +170,85 @@ class Banana(SquishSprite):
     """
 
     def __init__(self):
-        super().__init__(config.banana_image)
+        super().__init__(settings.current.banana_image)
         self.rect.bottom = self.area.bottom
         # These paddings represent parts of the image where there is
         # no banana. If a weight moves into these areas, it doesn't
         # constitute a hit (or, rather, a squish):
-        self.pad_top = config.banana_pad_top
-        self.pad_side = config.banana_pad_side
+        self.pad_top = settings.current.banana_pad_top
+        self.pad_side = settings.current.banana_pad_side
 
-    def update(self):
+    def reuse(self):
         """
-        Set the Banana's center x-coordinate to the current mouse
-        x-coordinate, and then use the rect method clamp to ensure
-        that the Banana stays within its allowed range of motion.
+        Readies a banana left over from an earlier level (see pool.py)
+        for a new level, where a new one would be.
+        """
+        self.area = settings.current.area
+        self.rect.left = 0
+        self.rect.bottom = self.area.bottom
+
+    def update(self, x=None):
         """
-        self.rect.centerx = pygame.mouse.get_pos()[0]
+        Set the Banana's center x-coordinate to x (by default, the
+        current mouse x-coordinate), and then use the rect method clamp
+        to ensure that the Banana stays within its allowed range of
+        motion.
+        """
+        if x is None:
+            x = presenter.mouse_pos()[0]
+        self.rect.centerx = x
         self.rect = self.rect.clamp(self.area)
 
-    def touches(self, other):
+    def bounds(self):
         """
-        Determines whether the banana touches another sprite (e.g., a
-        Weight). Instead of just using the rect method colliderect, a
-        new rectangle is first calculated (using the rect method
-        inflate with the side and top paddings) that does not include
-        the 'empty' areas on the top and sides of the banana.
+        Returns the part of the banana that can be hit. Instead of just
+        using the sprite rect, a new rectangle is calculated (using the
+        rect method inflate with the side and top paddings) that does
+        not include the 'empty' areas on the top and sides of the
+        banana.
         """
         # Deflate the bounds with the proper padding:
         bounds = self.rect.inflate(-self.pad_side, -self.pad_top)
         # Move the bounds, so they are placed at the bottom of the Banana:
         bounds.bottom = self.rect.bottom
-        # Check whether the bounds intersect with the other object's rect:
-        return bounds.colliderect(other.rect)
-
-
-class Egg(SquishSprite):
-    def __init__(self, speed):
-        super().__init__(config.egg_image)
-        self.landed = None
-        self.speed = speed
-        self.reset()
-
-    def reset(self):
-        x = randrange(self.area.left, self.area.right)
-        self.rect.midbottom = x, 0 - randrange(0, 1000)
+        return bounds
 
-    def update(self):
-        self.rect.top += self.speed
-        self.landed = self.rect.top >= self.area.bottom
+    def touches(self, other):
+        """
+        Determines whether the banana touches another sprite (e.g., a
+        Weight): pixel for pixel with config.pixel_collisions set, and
+        otherwise whether its bounds intersect with the other object's
+        rect.
+        """
+        if settings.current.pixel_collisions:
+            return self.overlaps(other)
+        return self.bounds().colliderect(other.rect)
 
 
 class Basket(SquishSprite):
     def __init__(self):
-        super().__init__(config.basket_image)
+        super().__init__(settings.current.basket_image)
+        self.rect.bottom = self.area.bottom
+        self.pad_top = settings.current.basket_pad_top
+        self.pad_side = settings.current.basket_pad_side
+
+    def reuse(self):
+        self.area = settings.current.area
+        self.rect.left = 0
         self.rect.bottom = self.area.bottom
-        self.pad_top = config.basket_pad_top
-        self.pad_side = config.basket_pad_side
 
-    def update(self):
-        self.rect.centerx = pygame.mouse.get_pos()[0]
+    def update(self, x=None):
+        if x is None:
+            x = presenter.mouse_pos()[0]
+        self.rect.centerx = x
         self.rect = self.rect.clamp(self.area)
 
-    def touches(self, other):
+    def bounds(self):
         bounds = self.rect.inflate(-self.pad_side, -self.pad_top)
         bounds.bottom = self.rect.bottom
-        return bounds.colliderect(other.rect)
+        return bounds
+
+    def touches(self, other):
+        if settings.current.pixel_collisions:
+            return self.overlaps(other)
+        return self.bounds().colliderect(other.rect)
@@ -0,0 +1,67 @@
+import pygame
+
+"This module contains the sprite pool of the Squish game."
+
+
+class SpritePool:
+
+    """
+    Keeps the sprites and sprite groups of finished levels around, so
+    the next level (or the next game) can reuse them instead of
+    building new ones. Reused sprites are readied for their new level
+    by their reuse method, which takes the same arguments as their
+    constructor.
+    """
+
+    def __init__(self):
+        self.sprites = {}  # Free sprites by class
+        self.groups = []   # Free (empty) RenderUpdates groups
+        self.created = 0
+        self.reused = 0
+
+    def get(self, cls, *args):
+        """
+        Returns a sprite of the class cls, set up with the given
+        constructor arguments.
+        """
+        free = self.sprites.get(cls)
+        if free:
+            self.reused += 1
+            sprite = free.pop()
+            sprite.reuse(*args)
+            return sprite
+        self.created += 1
+        return cls(*args)
+
+    def group(self, *sprites):
+        """
+        Returns a RenderUpdates group containing the given sprites.
+        """
+        if self.groups:
+            group = self.groups.pop()
+            group.add(*sprites)
+            return group
+        return pygame.sprite.RenderUpdates(*sprites)
+
+    def clear(self):
+        """
+        Drops the free sprites, e.g., when the images they were made
+        with have changed. The groups are still reused.
+        """
+        self.sprites.clear()
+
+    def release(self, group):
+        """
+        Takes back a group and all the sprites in it, which must not be
+        used by their level any more.
+        """
+        for sprite in group.sprites():
+            self.sprites.setdefault(type(sprite), []).append(sprite)
+        group.empty()
+        # Forget where the sprites were drawn (for the next RenderUpdates.draw):
+        del group.lostsprites[:]
+        self.groups.append(group)
+
+
+# The pool shared by all the levels:
+pool = SpritePool()
@@ -0,0 +1,267 @@
+import os
+
+import pygame
+
+from memory import memory
+
+try:
+    from pygame._sdl2 import video
+except ImportError:  # Older pygame (or SDL 1): only the Surface backend
+    video = None
+
+"This module contains the display presenter of the Squish game."
+
+# How the screen may be scaled to the window (see config.scale_mode):
+SCALE_MODES = 'smooth', 'nearest', 'integer'
+# How frames may be put on the display (see config.render_backend):
+BACKENDS = 'surface', 'renderer'
+
+
+class Presenter:
+
+    """
+    Puts what the states draw on the display. By default the states
+    draw straight to the window, and presenting a frame is simply
+    pygame.display.flip or update. When scaled, they draw to a surface
+    of the game's own size instead, which is scaled to the window (or
+    the whole display in full screen mode) in one step per frame, so
+    the cost of drawing doesn't grow with the display. The mouse
+    position is then mapped back from the window to that surface.
+
+    With the renderer backend, frames are put on the display by an SDL
+    Renderer (with the GPU where there is one, and SDL's software
+    renderer otherwise). What the states draw on the screen surface is
+    uploaded to a texture, and the levels draw their sprites as
+    textures (see render), each image being uploaded only once. The
+    renderer does the scaling.
+    """
+
+    def __init__(self):
+        self.window = None
+        self.screen = None
+        self.target = None  # Where the screen is scaled to in the window
+        self.mode = None
+        self.renderer = None  # With the renderer backend
+        self.textures = {}    # Uploaded images, by surface
+        self.overlay = None   # Texture and rect drawn over the next frame
+        self.shown = None     # The surface the frame texture holds
+
+    def open(self, size, flags=0, window_size=None, mode=None, backend='surface'):
+        """
+        Opens the window and returns the surface for the states to draw
+        on, which is size pixels large. With a scale mode ('smooth',
+        'nearest' or 'integer', which only scales by whole factors) it
+        is scaled to a window of window_size (by default the size of
+        the display in full screen mode, and size otherwise). The
+        backend is 'surface' or 'renderer'; the surface backend is used
+        if there is no renderer.
+        """
+        if mode is not None and mode not in SCALE_MODES:
+            raise ValueError('unknown scale mode {!r}'.format(mode))
+        if backend not in BACKENDS:
+            raise ValueError('unknown render backend {!r}'.format(backend))
+        self.renderer = None
+        self.textures = {}
+        self.overlay = self.shown = None
+        if backend == 'renderer' and video is not None:
+            return self.open_renderer(size, flags, window_size, mode)
+        if mode is None:
+            self.window = self.screen = pygame.display.set_mode(size, flags)
+            self.target = self.mode = None
+            return self.screen
+        if not window_size:
+            window_size = (0, 0) if flags & pygame.FULLSCREEN else size
+        self.window = pygame.display.set_mode(window_size, flags)
+        self.screen = memory.track(pygame.Surface(size).convert(), 'Presenter')
+        self.mode = mode
+        self.target = self.fit(size, self.window.get_size(), mode)
+        self.window.fill((0, 0, 0))
+        pygame.display.flip()
+        return self.screen
+
+    def open_renderer(self, size, flags, window_size, mode):
+        # The images are still loaded and converted by pygame, which
+        # needs a display mode for that; it is kept hidden:
+        pygame.display.set_mode((1, 1), pygame.HIDDEN)
+        # These must be set before the renderer and textures are made:
+        os.environ['SDL_RENDER_SCALE_QUALITY'] = '1' if mode == 'smooth' else '0'
+        os.environ.setdefault('SDL_RENDER_BATCHING', '1')
+        full_screen = bool(flags & pygame.FULLSCREEN)
+        if mode is None:
+            self.window = video.Window('Squish', size, fullscreen=full_screen)
+        else:
+            self.window = video.Window('Squish', window_size or size,
+                                       fullscreen_desktop=full_screen and not window_size)
+        self.renderer = video.Renderer(self.window, accelerated=-1)
+        self.screen = memory.track(pygame.Surface(size).convert(), 'Presenter')
+        self.frame = video.Texture(self.renderer, size, streaming=True)
+        self.mode = mode
+        self.target = self.fit(size, self.window.size, mode or 'integer')
+        # Draw in screen coordinates, scaled into the target:
+        factor = self.target.width / size[0]
+        self.renderer.scale = factor, factor
+        self.renderer.set_viewport((round(self.target.left / factor), round(self.target.top / factor)) + tuple(size))
+        self.renderer.draw_color = 0, 0, 0, 255
+        return self.screen
+
+    def fit(self, size, window_size, mode):
+        """
+        Returns where a screen of the given size goes in a window of
+        window_size: as large as it fits (by a whole factor, in integer
+        mode, unless the window is too small for even the screen's own
+        size) with the same aspect ratio, and centered, with black
+        borders around it.
+        """
+        width, height = window_size
+        factor = min(width / size[0], height / size[1])
+        if mode == 'integer' and factor >= 1:
+            factor = int(factor)
+        target = pygame.Rect(0, 0, round(size[0] * factor), round(size[1] * factor))
+        target.center = width // 2, height // 2
+        return target.clip(pygame.Rect(0, 0, width, height))
+
+    def flip(self):
+        """
+        Presents the whole screen.
+        """
+        if self.renderer is not None:
+            self.frame.update(self.screen)
+            self.shown = self.screen
+            self.present_texture()
+        elif self.target is None:
+            pygame.display.flip()
+        else:
+            self.present()
+
+    def update(self, rects):
+        """
+        Presents the parts of the screen in rects (a list of rects).
+        When scaled, the whole screen is presented in one scaled blit
+        if any of it has changed, except in integer mode, where the
+        rects can be scaled on their own without any seams (as long as
+        the screen isn't scaled down to fit a smaller window).
+        """
+        if self.renderer is not None:
+            if self.shown is not self.screen:
+                self.flip()
+            elif rects:
+                bounds = self.screen.get_rect()
+                for rect in rects:
+                    rect = bounds.clip(rect)
+                    if rect:
+                        self.frame.update(self.screen.subsurface(rect), rect)
+                self.present_texture()
+        elif self.target is None:
+            pygame.display.update(rects)
+        elif self.mode == 'integer' and rects and self.target.width >= self.screen.get_width():
+            factor = self.target.width // self.screen.get_width()
+            bounds = self.screen.get_rect()
+            updates = []
+            for rect in rects:
+                rect = bounds.clip(rect)
+                if not rect:
+                    continue
+                target = pygame.Rect(self.target.left + rect.left * factor, self.target.top + rect.top * factor,
+                                     rect.width * factor, rect.height * factor)
+                pygame.transform.scale(self.screen.subsurface(rect), target.size, self.window.subsurface(target))
+                updates.append(target)
+            pygame.display.update(updates)
+        elif rects:
+            self.present()
+
+    def repaint(self):
+        """
+        Presents the last frame again, e.g., when the window has been
+        uncovered and the system hasn't kept what was in it. With the
+        renderer backend, a level presents a whole frame every tick
+        anyway, so only what was drawn on the screen is presented again.
+        """
+        if self.renderer is None:
+            pygame.display.flip()
+        elif self.shown is self.screen:
+            self.present_texture()
+
+    def present(self):
+        target = self.window.subsurface(self.target)
+        if self.mode == 'smooth':
+            pygame.transform.smoothscale(self.screen, self.target.size, target)
+        else:
+            pygame.transform.scale(self.screen, self.target.size, target)
+        pygame.display.update(self.target)
+
+    def present_texture(self):
+        self.renderer.clear()
+        self.frame.draw()
+        self.finish()
+
+    def finish(self):
+        if self.overlay is not None:
+            texture, rect = self.overlay
+            texture.draw(dstrect=rect)
+            self.overlay = None
+        self.renderer.present()
+
+    def texture(self, image):
+        """
+        Returns the texture of an image, uploading it the first time.
+        """
+        texture = self.textures.get(image)
+        if texture is None:
+            texture = self.textures[image] = video.Texture.from_surface(self.renderer, image)
+        return texture
+
+    def render(self, background, changed, images):
+        """
+        Presents a frame with the renderer backend: the background
+        surface (of which only the changed rects are uploaded again),
+        with the (image, position) pairs in images drawn over it as
+        textures.
+        """
+        if background is not self.shown:
+            self.frame.update(background)
+            self.shown = background
+        else:
+            for rect in changed:
+                self.frame.update(background.subsurface(rect), rect)
+        self.renderer.clear()
+        self.frame.draw()
+        texture = self.texture
+        for image, position in images:
+            texture(image).draw(dstrect=position)
+        self.finish()
+
+    def show(self, screen, image, rect, changed=()):
+        """
+        Shows image (e.g., the profiler overlay) at rect over the
+        screen, presenting the changed rects of the screen along with
+        it. With the renderer backend, it is drawn over the next frame
+        that is presented.
+        """
+        if self.renderer is not None:
+            self.overlay = video.Texture.from_surface(self.renderer, image), rect
+        else:
+            screen.blit(image, rect)
+            self.update([rect] + list(changed))
+
+    def to_screen(self, pos):
+        """
+        Maps a position in the window (e.g., of a mouse event) to the
+        screen the states draw on.
+        """
+        if self.target is None:
+            return pos
+        x, y = pos
+        width, height = self.screen.get_size()
+        x = (x - self.target.left) * width // self.target.width
+        y = (y - self.target.top) * height // self.target.height
+        return min(max(x, 0), width - 1), min(max(y, 0), height - 1)
+
+    def mouse_pos(self):
+        """
+        Returns the mouse position on the screen the states draw on.
+        """
+        return self.to_screen(pygame.mouse.get_pos())
+
+
+# The presenter shared by all the states:
+presenter = Presenter()
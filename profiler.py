@@ -0,0 +1,187 @@
+import csv
+import json
+import time
+
+from collections import deque
+
+import pygame
+import settings
+
+from assets import assets
+from hud import hud
+from inputs import inputs
+from memory import memory
+from present import presenter
+
+"This module contains the frame profiler of the Squish game."
+
+
+class Counters:
+
+    """
+    Running totals of the drawing work done by the states. They are
+    plain integers that the drawing code adds to, so keeping them costs
+    next to nothing when nobody is profiling.
+    """
+
+    def __init__(self):
+        self.blits = 0     # Images blitted to the screen (or background)
+        self.presents = 0  # Calls to pygame.display.update or flip
+        self.rects = 0     # Rects passed to pygame.display.update
+        self.masks = 0       # Collision masks built
+        self.mask_tests = 0  # Pairs of sprites tested pixel for pixel
+
+
+counters = Counters()
+
+
+class FrameProfiler:
+
+    """
+    Records, for each frame of Game.run, the time spent in each phase
+    of the main loop (see PHASES), how many blits, display updates and
+    asset loads it caused, and its input latency (see inputs.py; 0 for
+    frames that don't show the pointer). The last history frames are
+    kept, and may be shown in an overlay or saved as CSV, JSON or a
+    Chrome trace (for chrome://tracing or Perfetto).
+    """
+
+    PHASES = 'events', 'update', 'display', 'tick'
+    COUNTS = 'blits', 'presents', 'rects', 'loads', 'masks', 'mask_tests'
+
+    def __init__(self, history=600):
+        self.frames = deque(maxlen=history)
+        self.overlay = False
+        self.under = None   # What the overlay box covers on the screen, and where
+        self.erased = None  # Where the box was erased for this frame
+        self.start = self.begun = self.last = time.perf_counter()
+        self.times = {}
+        self.snapshot = self.counts()
+
+    def counts(self):
+        return (counters.blits, counters.presents, counters.rects, assets.loads,
+                counters.masks, counters.mask_tests)
+
+    def begin(self):
+        """
+        Starts timing a new frame.
+        """
+        self.begun = self.last = time.perf_counter()
+        self.times = {}
+
+    def mark(self, phase):
+        """
+        Ends the given phase of the current frame (the next phase
+        starts right away).
+        """
+        now = time.perf_counter()
+        self.times[phase] = now - self.last
+        self.last = now
+
+    def end(self):
+        """
+        Ends the current frame and records it.
+        """
+        counts = self.counts()
+        frame = {'start': self.begun - self.start}
+        for phase in self.PHASES:
+            frame[phase] = self.times.get(phase, 0.0)
+        for name, new, old in zip(self.COUNTS, counts, self.snapshot):
+            frame[name] = new - old
+        self.snapshot = counts
+        frame['latency'] = inputs.latency or 0.0
+        self.frames.append(frame)
+
+    def summary(self, last=60):
+        """
+        Returns a line of text with the mean frame rate and phase times
+        (in milliseconds) of the last recorded frames, and the hit rate
+        of the HUD caches.
+        """
+        frames = list(self.frames)[-last:]
+        n = len(frames)
+        if not n:
+            return ''
+        total = sum(sum(frame[phase] for phase in self.PHASES) for frame in frames)
+        parts = ['{:.0f} fps'.format(n / total if total else 0)]
+        for phase in self.PHASES[:-1]:
+            parts.append('{} {:.2f}'.format(phase, sum(frame[phase] for frame in frames) / n * 1000))
+        parts.append('blits {:.0f}'.format(sum(frame['blits'] for frame in frames) / n))
+        parts.append('hud hits {:.0%}'.format(hud.hit_rate))
+        if inputs.latencies:
+            parts.append('latency p50 {:.1f} p99 {:.1f}'.format(*inputs.percentiles((0.5, 0.99))))
+        return '  '.join(parts)
+
+    def erase(self, screen):
+        """
+        Puts back what the overlay box covered, before the next frame
+        is drawn, so the states draw (and, with dirty rects, erase) as
+        if it had never been there.
+        """
+        self.erased = None
+        if self.under is not None:
+            image, rect = self.under
+            screen.blit(image, rect)
+            self.erased = rect
+            self.under = None
+
+    def finish(self, screen):
+        """
+        Draws the overlay, if it is on, and presents the part of the
+        screen erase has put back.
+        """
+        if self.overlay:
+            self.draw(screen)
+        elif self.erased:
+            presenter.update([self.erased])
+        self.erased = None
+
+    def draw(self, screen):
+        """
+        Draws the summary in a box at the top of the screen and updates
+        that part of the display (and where the box was the frame
+        before).
+        """
+        font = assets.font(settings.current.font_path, 14)
+        text = memory.track(font.render(self.summary(), True, (255, 255, 255)), 'FrameProfiler')
+        rect = text.get_rect(midtop=(screen.get_width() // 2, 0)).inflate(8, 4)
+        box = memory.track(pygame.Surface(rect.size), 'FrameProfiler')
+        box.blit(text, text.get_rect(center=box.get_rect().center))
+        if presenter.renderer is None:
+            # Drawn on the screen itself, so what it covers is kept:
+            under = rect.clip(screen.get_rect())
+            self.under = memory.track(screen.subsurface(under).copy(), 'FrameProfiler'), under
+        presenter.show(screen, box, rect, [self.erased] if self.erased else [])
+
+    def save(self, name):
+        """
+        Saves the recorded frames as name.csv, name.json and (as a
+        Chrome trace) name.trace.json.
+        """
+        fields = ['start'] + list(self.PHASES) + list(self.COUNTS) + ['latency']
+        with open(name + '.csv', 'w', newline='') as file:
+            writer = csv.DictWriter(file, fields)
+            writer.writeheader()
+            writer.writerows(self.frames)
+        with open(name + '.json', 'w') as file:
+            json.dump(list(self.frames), file)
+        with open(name + '.trace.json', 'w') as file:
+            json.dump({'traceEvents': self.trace()}, file)
+
+    def trace(self):
+        """
+        Returns the recorded frames as Chrome trace events: one for
+        each frame, with one for each phase nested in it.
+        """
+        events = []
+        for number, frame in enumerate(self.frames):
+            start = frame['start'] * 1e6
+            duration = sum(frame[phase] for phase in self.PHASES) * 1e6
+            args = {name: frame[name] for name in self.COUNTS + ('latency',)}
+            events.append({'name': 'frame {}'.format(number), 'ph': 'X', 'pid': 1, 'tid': 1,
+                           'ts': start, 'dur': duration, 'args': args})
+            for phase in self.PHASES:
+                events.append({'name': phase, 'ph': 'X', 'pid': 1, 'tid': 1,
+                               'ts': start, 'dur': frame[phase] * 1e6})
+                start += frame[phase] * 1e6
+        return events
@@ -0,0 +1,165 @@
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+
+from array import array
+
+import settings
+
+"This module contains the session recorder and replayer of the Squish game."
+
+# A recording starts with a header (magic, version, tick rate and the
+# seed of the random module), followed by records that each start with
+# a single byte:
+#   L  a level starts: mode, number, score and lives
+#   T  a run of ticks: count, and one catcher x-coordinate per tick
+#   E  the level ended: score and lives
+MAGIC = b'SQRP'
+VERSION = 1
+HEADER = struct.Struct('<4sBHQ')
+LEVEL = struct.Struct('<BHii')
+TICKS = struct.Struct('<H')
+END = struct.Struct('<ii')
+
+
+class Recorder:
+
+    """
+    Records a session of the game to a binary file, compactly enough
+    to leave running. Everything that is random in the game comes from
+    the random module, which the recorder seeds, and the only input to
+    a level is the catcher position of each tick, so the seed, the
+    levels and their ticks are all it takes to play the session again.
+    """
+
+    def __init__(self, name, seed=None):
+        if seed is None:
+            seed = int.from_bytes(os.urandom(8), 'little')
+        random.seed(seed)
+        self.file = open(name, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, settings.current.tick_rate, seed))
+        self.ticks = array('h')
+
+    def level(self, level):
+        """
+        Records the start of a level.
+        """
+        self.flush()
+        self.file.write(b'L' + LEVEL.pack(level.mode, level.number, level.score, level.lives))
+
+    def tick(self, x):
+        """
+        Records the catcher position of a tick.
+        """
+        self.ticks.append(x)
+        if len(self.ticks) == 4096:
+            self.flush()
+
+    def end(self, level):
+        """
+        Records the end of a level, with its score and lives.
+        """
+        self.flush()
+        self.file.write(b'E' + END.pack(level.score, level.lives))
+
+    def flush(self):
+        if self.ticks:
+            self.file.write(b'T' + TICKS.pack(len(self.ticks)) + self.ticks.tobytes())
+            del self.ticks[:]
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read(name):
+    """
+    Reads a recording, and returns its tick rate, its seed and a list
+    of its levels, as (mode, number, score, lives, xs, end) tuples,
+    where xs is an array of the catcher positions of each tick and end
+    is the recorded (score, lives) at the end of the level (or None if
+    the recording stops before that).
+    """
+    with open(name, 'rb') as file:
+        data = file.read()
+    magic, version, tick_rate, seed = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('{} is not a Squish recording'.format(name))
+    levels = []
+    offset = HEADER.size
+    while offset < len(data):
+        kind = data[offset:offset + 1]
+        offset += 1
+        if kind == b'L':
+            levels.append(LEVEL.unpack_from(data, offset) + (array('h'), None))
+            offset += LEVEL.size
+        elif kind == b'T':
+            count, = TICKS.unpack_from(data, offset)
+            offset += TICKS.size
+            levels[-1][4].frombytes(data[offset:offset + 2 * count])
+            offset += 2 * count
+        elif kind == b'E':
+            levels[-1] = levels[-1][:5] + (END.unpack_from(data, offset),)
+            offset += END.size
+        else:
+            raise ValueError('{} is corrupt at byte {}'.format(name, offset - 1))
+    return tick_rate, seed, levels
+
+
+def replay(name, display=False):
+    """
+    Plays a recording again, headless and as fast as possible. With
+    display set, every tick is also drawn (on the dummy display). Yields
+    the level number, the (score, lives) it ended with, the recorded
+    ones and the number of ticks for each level.
+    """
+    # Not imported at the top, since sim switches SDL to its dummy
+    # drivers and the game itself uses this module for recording:
+    import sim
+    import pygame
+    tick_rate, seed, levels = read(name)
+    sim.init()
+    if display:
+        pygame.font.init()
+    screen = pygame.display.get_surface()
+    rng = random.Random(seed)
+    dt = 1 / tick_rate
+    for mode, number, score, lives, xs, end in levels:
+        level = sim.LEVELS[mode](mode, number, score, lives, rng=rng)
+        level.quiet = True
+        if display:
+            level.first_display(screen)
+        for x in xs:
+            level.step(x, dt)
+            if display:
+                level.display(screen)
+        level.leave()
+        yield number, (level.score, level.lives), end, len(xs)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Replay a recorded Squish session headlessly.')
+    parser.add_argument('recording')
+    parser.add_argument('--display', action='store_true', help='draw every tick as well')
+    options = parser.parse_args(args)
+
+    start = time.perf_counter()
+    ticks = 0
+    diverged = False
+    for number, result, recorded, count in replay(options.recording, options.display):
+        ticks += count
+        note = ''
+        if recorded is not None and result != recorded:
+            note = '  DIVERGED (recorded score {}, lives {})'.format(*recorded)
+            diverged = True
+        print('level {:3}: {:7} ticks, score {}, lives {}{}'.format(number, count, *result, note))
+    elapsed = time.perf_counter() - start
+    print('{} ticks in {:.2f} s ({:.0f} ticks per second)'.format(ticks, elapsed, ticks / elapsed if elapsed else 0))
+    return 1 if diverged else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
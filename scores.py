@@ -0,0 +1,288 @@
+import argparse
+import bisect
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+
+import settings
+
+"This module contains the high-score and session-stats store of the Squish game."
+
+# The log is a file of fixed-size records that is only ever appended
+# to, one for every level that ends: when it ended (in seconds since
+# the epoch), the game mode, how it ended (CLEARED or OVER), the level
+# number, the score and the seconds it was played for.
+RECORD = struct.Struct('<dBBHif')
+CLEARED, OVER = 0, 1
+MODES = 3
+# The index sums the log up: a header (magic, version and how many
+# bytes of the log it covers), and for each mode, the games played, the
+# levels cleared, the seconds played and the number of best scores
+# kept, followed by those (score, level, time) entries, best first.
+MAGIC = b'SQHS'
+VERSION = 1
+INDEX_HEADER = struct.Struct('<4sBQ')
+STATS = struct.Struct('<QQdH')
+ENTRY = struct.Struct('<iHd')
+TOP = 100  # Best scores kept for each mode
+CHUNK = 65536  # Records read at a time when the index is rebuilt
+
+
+class Index:
+
+    """
+    The stats and the best game scores of every mode, as of the first
+    size bytes of the log. It is updated record by record, so it never
+    has to be worked out from the whole log again.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.games = [0] * MODES
+        self.levels = [0] * MODES
+        self.seconds = [0.0] * MODES
+        self.best = [[] for _ in range(MODES)]  # (-score, time, level), best first
+
+    def add(self, record):
+        """
+        Takes a (time, mode, event, number, score, seconds) record into
+        account.
+        """
+        when, mode, event, number, score, seconds = record
+        self.seconds[mode] += seconds
+        if event == CLEARED:
+            self.levels[mode] += 1
+            return
+        self.games[mode] += 1
+        best = self.best[mode]
+        entry = -score, when, number
+        if len(best) < TOP or entry < best[-1]:
+            bisect.insort(best, entry)
+            del best[TOP:]
+
+    def top(self, mode, n):
+        """
+        Returns the n best game scores of the mode, as (score, level,
+        time) tuples.
+        """
+        return [(-score, number, when) for score, when, number in self.best[mode][:n]]
+
+    def copy(self):
+        index = Index()
+        index.size = self.size
+        index.games = self.games[:]
+        index.levels = self.levels[:]
+        index.seconds = self.seconds[:]
+        index.best = [best[:] for best in self.best]
+        return index
+
+    def pack(self):
+        parts = [INDEX_HEADER.pack(MAGIC, VERSION, self.size)]
+        for mode in range(MODES):
+            best = self.best[mode]
+            parts.append(STATS.pack(self.games[mode], self.levels[mode], self.seconds[mode], len(best)))
+            parts.extend(ENTRY.pack(-score, number, when) for score, when, number in best)
+        return b''.join(parts)
+
+    @classmethod
+    def unpack(cls, data):
+        """
+        Returns the index packed in data, or None if it isn't one.
+        """
+        try:
+            magic, version, size = INDEX_HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION:
+                return None
+            index = cls()
+            index.size = size
+            offset = INDEX_HEADER.size
+            for mode in range(MODES):
+                games, levels, seconds, count = STATS.unpack_from(data, offset)
+                offset += STATS.size
+                index.games[mode] = games
+                index.levels[mode] = levels
+                index.seconds[mode] = seconds
+                index.best[mode] = [(-score, when, number) for score, number, when in
+                                    ENTRY.iter_unpack(data[offset:offset + count * ENTRY.size])]
+                offset += count * ENTRY.size
+        except struct.error:
+            return None
+        return index
+
+
+class Store:
+
+    """
+    Keeps the results of every level played in an append-only log,
+    with an index of the stats and best scores of each mode next to it
+    (see Index). Adding a result only updates the index in memory and
+    queues the record; a background thread appends the queued records
+    to the log and rewrites the index, so saving never blocks a frame.
+
+    Reading the best scores doesn't touch the disk at all. Opening the
+    store reads the index, and only the part of the log written after
+    it (none, unless the game stopped between the two), so it takes the
+    same time with millions of records as with a few.
+    """
+
+    def __init__(self):
+        self.index = Index()
+        self.queue = None
+        self.thread = None
+
+    def open(self, directory):
+        """
+        Opens the store in directory (making it if needed), and starts
+        the thread that writes to it. If it can't be written to (e.g.,
+        in a read-only install), whatever could be read from it is kept
+        in memory, along with the results still to come.
+        """
+        log_path = os.path.join(directory, 'scores.log')
+        index_path = os.path.join(directory, 'scores.idx')
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self.index = self.read(log_path, index_path)
+            file = open(log_path, 'ab', buffering=0)
+            # A record cut short (e.g., by a power cut) is dropped:
+            file.truncate(self.index.size)
+        except OSError as error:
+            print('Keeping the scores in memory only: {}'.format(error))
+            return
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.write, args=(file, index_path, self.index.copy()),
+                                       name='score writer', daemon=True)
+        self.thread.start()
+
+    def read(self, log_path, index_path):
+        """
+        Returns the index of the whole records in the log: the one
+        saved, brought up to date with the records after it.
+        """
+        try:
+            with open(index_path, 'rb') as file:
+                index = Index.unpack(file.read())
+        except OSError:
+            index = None
+        try:
+            size = os.path.getsize(log_path)
+        except OSError:
+            size = 0
+        whole = size - size % RECORD.size
+        if index is None or index.size > whole:
+            index = Index()
+        if index.size < whole:
+            with open(log_path, 'rb') as file:
+                file.seek(index.size)
+                while index.size < whole:
+                    data = file.read(min(CHUNK * RECORD.size, whole - index.size))
+                    for record in RECORD.iter_unpack(data):
+                        index.add(record)
+                    index.size += len(data)
+        return index
+
+    def add(self, mode, event, number, score, seconds):
+        """
+        Saves the result of a level that has just ended (event is
+        CLEARED or OVER). If the store isn't open, it is only kept in
+        memory.
+        """
+        record = time.time(), mode, event, number, score, seconds
+        self.index.add(record)
+        if self.queue is not None:
+            self.queue.put(record)
+
+    def top(self, mode, n):
+        """
+        Returns the n best game scores of the mode, as (score, level,
+        time) tuples.
+        """
+        return self.index.top(mode, n)
+
+    def write(self, file, index_path, index):
+        failed = False
+        with file:
+            while True:
+                # Everything queued so far is written in one go:
+                records = [self.queue.get()]
+                while True:
+                    try:
+                        records.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                done = None in records
+                records = [record for record in records if record is not None]
+                if records:
+                    try:
+                        self.save(file, index_path, index, records)
+                        failed = False
+                    except OSError as error:
+                        # E.g., the disk is full. The results are still
+                        # shown, and the next ones are tried again:
+                        if not failed:
+                            print('Could not save the scores: {}'.format(error))
+                        failed = True
+                if done:
+                    return
+
+    def save(self, file, index_path, index, records):
+        """
+        Appends records to the log (an unbuffered file), and rewrites
+        the index.
+        """
+        data = b''.join(RECORD.pack(*record) for record in records)
+        try:
+            if file.write(data) != len(data):
+                raise OSError('the disk is full')
+        except OSError:
+            # Don't leave part of the records behind:
+            file.truncate(index.size)
+            raise
+        for record in records:
+            index.add(record)
+        index.size += len(data)
+        # The index is replaced in one step, so it is never seen half
+        # written:
+        with open(index_path + '.tmp', 'wb') as index_file:
+            index_file.write(index.pack())
+        os.replace(index_path + '.tmp', index_path)
+
+    def close(self):
+        """
+        Writes whatever is still queued, and stops the writer thread.
+        """
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = self.queue = None
+
+
+# The store shared by all the states:
+scores = Store()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Show the Squish high scores and session stats.')
+    parser.add_argument('--dir', default=settings.current.scores_dir,
+                        help='directory of the store (default: config.scores_dir)')
+    parser.add_argument('--top', type=int, default=10, help='best scores to show for each mode')
+    options = parser.parse_args(args)
+    if not options.dir:
+        raise SystemExit('config.scores_dir is empty, and no --dir was given')
+    scores.open(options.dir)
+    scores.close()
+    index = scores.index
+    print('{} records'.format(index.size // RECORD.size))
+    for mode, name in enumerate(['banana', 'basket', 'swarm']):
+        print('{} mode: {} games, {} levels cleared, {:.0f} minutes played'.format(
+            name, index.games[mode], index.levels[mode], index.seconds[mode] / 60))
+        for rank, (score, number, when) in enumerate(index.top(mode, options.top), 1):
+            print('  {:3}. {:8}  level {:3}  {}'.format(
+                rank, score, number, time.strftime('%Y-%m-%d %H:%M', time.localtime(when))))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import itertools
+import struct
+import sys
+
+import sim  # First, so the game runs on SDL's dummy drivers
+import settings
+
+"This module contains the headless multi-session server of the Squish game."
+
+# The protocol (all little-endian). A client opens a connection with a
+# hello (the game mode and the random seed), and then sends the x
+# position of its catcher whenever it likes; the last one received
+# before a tick is used for that tick.
+HELLO = struct.Struct('<BI')  # Mode, seed
+INPUT = struct.Struct('<h')   # Catcher x
+# After every tick, the server sends a frame: a header (the tick, the
+# catcher x as clamped by the game, the score, the lives, the level
+# number, flags and a count) followed by count objects, each an index
+# and an (x, y) center. Only the objects that have moved since the last
+# frame sent are included, unless the FULL flag is set, in which case
+# all of them are (e.g., on a new level). OVER is set on the last frame
+# of a game; the next one starts a new game.
+HEADER = struct.Struct('<IhiBHBH')
+OBJECT = struct.Struct('<Hhh')
+FULL = 1
+OVER = 2
+
+# Frames are dropped for clients that have this many bytes waiting to
+# be sent (the next one sent has everything that has changed since):
+MAX_BUFFER = 64 * 1024
+
+
+class Session:
+
+    """
+    One client's game, a sim.Env driven by the catcher positions the
+    client sends. It keeps the object positions it has last sent, so
+    that each frame only has the ones that have moved since.
+    """
+
+    def __init__(self, mode, seed, writer):
+        self.env = sim.Env(mode, seed)
+        self.writer = writer
+        self.x = self.env.level.catcher.rect.centerx
+        self.sent = None   # The object positions the client has
+        self.number = None  # The level they are in
+
+    def tick(self):
+        """
+        Moves the game one tick forward, and returns the frame to send
+        (None if the client is too far behind to take one). A game
+        that is over is restarted after its last frame.
+        """
+        _, done = self.env.step(self.x)
+        frame = self.frame(OVER if done else 0)
+        if done:
+            self.env.reset()
+            self.sent = None
+        return frame
+
+    def frame(self, flags):
+        if self.writer.transport.get_write_buffer_size() > MAX_BUFFER:
+            return None
+        x, positions, score, lives, number = self.env.observe()
+        sent = self.sent
+        if sent is None or number != self.number or len(positions) != len(sent):
+            flags |= FULL
+            changed = [(i, px, py) for i, (px, py) in enumerate(positions)]
+        else:
+            changed = [(i, px, py) for i, ((px, py), old) in enumerate(zip(positions, sent))
+                       if (px, py) != old]
+        self.sent = positions
+        self.number = number
+        header = HEADER.pack(self.env.ticks, x, score, max(lives, 0), number, flags, len(changed))
+        return header + b''.join(itertools.starmap(OBJECT.pack, changed))
+
+    def close(self):
+        self.env.level.leave()
+
+
+class Server:
+
+    """
+    Runs the sessions of all the connected clients on one event loop.
+    A single scheduler moves every session forward once per tick (at
+    config.tick_rate), so the cost of timing doesn't grow with the
+    number of sessions. When a tick takes longer than the time it has,
+    the next one starts right away; when the server falls more than a
+    tick behind, it skips the ticks it has missed instead of trying to
+    catch up (the games then run slower than real time, and the skips
+    are counted).
+    """
+
+    def __init__(self):
+        self.sessions = set()
+        self.ticks = 0
+        self.skipped = 0
+        self.busy = 0.0  # Seconds spent running ticks
+        self.sent = 0    # Bytes
+        self.dropped = 0  # Frames not sent to clients that were behind
+
+    async def handle(self, reader, writer):
+        """
+        Serves one client: reads its hello, and then its catcher
+        positions until it disconnects.
+        """
+        session = None
+        try:
+            mode, seed = HELLO.unpack(await reader.readexactly(HELLO.size))
+            if mode not in sim.LEVELS:
+                return
+            session = Session(mode, seed, writer)
+            self.sessions.add(session)
+            pending = b''
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                pending += data
+                whole = len(pending) - len(pending) % INPUT.size
+                if whole:
+                    session.x, = INPUT.unpack_from(pending, whole - INPUT.size)
+                    pending = pending[whole:]
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if session is not None:
+                self.sessions.discard(session)
+                session.close()
+            writer.close()
+
+    async def schedule(self):
+        """
+        Runs the ticks of all the sessions, forever.
+        """
+        loop = asyncio.get_running_loop()
+        period = settings.current.dt
+        deadline = loop.time()
+        while True:
+            start = loop.time()
+            for session in list(self.sessions):
+                if session.writer.is_closing():
+                    continue
+                frame = session.tick()
+                if frame is None:
+                    self.dropped += 1
+                else:
+                    session.writer.write(frame)
+                    self.sent += len(frame)
+            now = loop.time()
+            self.busy += now - start
+            self.ticks += 1
+            deadline += period
+            if now - deadline > period:
+                missed = int((now - deadline) / period)
+                self.skipped += missed
+                deadline += missed * period
+            await asyncio.sleep(max(deadline - now, 0))
+
+    async def report(self, interval):
+        """
+        Prints the number of sessions and what the server has done in
+        every interval (in seconds).
+        """
+        loop = asyncio.get_running_loop()
+        last = loop.time(), self.ticks, self.skipped, self.busy, self.sent, self.dropped
+        while True:
+            await asyncio.sleep(interval)
+            now = loop.time(), self.ticks, self.skipped, self.busy, self.sent, self.dropped
+            seconds, ticks, skipped, busy, sent, dropped = (b - a for a, b in zip(last, now))
+            last = now
+            print('{:6} sessions  {:6.1f} ticks/s  {:5} skipped  load {:4.0%}  '
+                  '{:8.1f} KB/s  {:6} frames dropped'.format(
+                      len(self.sessions), ticks / seconds, skipped, busy / seconds,
+                      sent / seconds / 1024, dropped), flush=True)
+
+    async def serve(self, host, port, interval=None):
+        sim.init()
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        print('Serving on', ', '.join('{}:{}'.format(*sock.getsockname()[:2]) for sock in server.sockets),
+              flush=True)
+        tasks = [asyncio.ensure_future(self.schedule())]
+        if interval:
+            tasks.append(asyncio.ensure_future(self.report(interval)))
+        async with server:
+            await asyncio.gather(*tasks)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Serve headless Squish games to remote clients.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=7777, help='port to listen on (default: 7777)')
+    parser.add_argument('--tick-rate', type=int, metavar='HZ',
+                        help='ticks per second of the games (default: config.tick_rate)')
+    parser.add_argument('--report', type=float, default=5, metavar='SECONDS',
+                        help='how often to print statistics (0 for never)')
+    options = parser.parse_args(args)
+    if options.tick_rate:
+        # A lower rate than the game's own lets more sessions share the
+        # server, at the cost of coarser steps:
+        settings.use(settings.current.replace(tick_rate=options.tick_rate))
+    try:
+        asyncio.run(Server().serve(options.host, options.port, options.report))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
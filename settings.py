@@ -0,0 +1,259 @@
+import os
+import runpy
+import sys
+
+import pygame
+
+"This module contains the loaded configuration of the Squish game."
+
+# The configuration file (see config.py), next to the game itself, or
+# in a bundle made with squish.spec, next to the executable (where it
+# can be edited) or else among the bundled data files:
+if getattr(sys, 'frozen', False):
+    CONFIG_FILE = os.path.join(os.path.dirname(sys.executable), 'config.py')
+    if not os.path.exists(CONFIG_FILE):
+        CONFIG_FILE = os.path.join(getattr(sys, '_MEIPASS', ''), 'config.py')
+else:
+    CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.py')
+# How many levels the level table is computed for in advance (later
+# levels are computed when they are reached):
+TABLE_LEVELS = 100
+
+
+def text(value):
+    return isinstance(value, str)
+
+
+def number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def positive(value):
+    return number(value) and value > 0
+
+
+def nonnegative(value):
+    return number(value) and value >= 0
+
+
+def integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def positive_integer(value):
+    return integer(value) and value > 0
+
+
+def nonnegative_integer(value):
+    return integer(value) and value >= 0
+
+
+def fraction(value):
+    return number(value) and 0 <= value <= 1
+
+
+def flag(value):
+    return value in (0, 1, True, False)
+
+
+def size(value):
+    return isinstance(value, tuple) and len(value) == 2 and all(isinstance(n, int) and n > 0 for n in value)
+
+
+def color(value):
+    return isinstance(value, tuple) and len(value) == 3 and all(isinstance(n, int) and 0 <= n <= 255 for n in value)
+
+
+def rect(value):
+    return isinstance(value, tuple) and len(value) == 4 and all(isinstance(n, int) for n in value)
+
+
+def rate(value):
+    # Recordings store the tick rate as an unsigned 16-bit number (see replay.py):
+    return positive_integer(value) and value < 2 ** 16
+
+
+def seed(value):
+    # Recordings store the seed as an unsigned 64-bit number (see replay.py):
+    return value is None or isinstance(value, int) and not isinstance(value, bool) and 0 <= value < 2 ** 64
+
+
+def window(value):
+    return value == 0 or size(value)
+
+
+def scaling(value):
+    return value in ('', 'smooth', 'nearest', 'integer')
+
+
+def backend(value):
+    return value in ('surface', 'renderer')
+
+
+# The settings in config.py, with the check each value must pass:
+FIELDS = {
+    'banana_image': text, 'weight16_image': text, 'weight8_image': text,
+    'splash_image': text, 'healthbar_image': text, 'basket_image': text,
+    'egg_image': text, 'font_path': text, 'atlas_dir': text,
+    'screen_size': size, 'background_color': color, 'margin': nonnegative,
+    'full_screen': flag, 'font_size': positive, 'score_font_size': positive,
+    'font_color': color, 'score_x': number, 'score_y': number,
+    'life_x': number, 'life_y': number, 'hud_cache_size': positive_integer,
+    'btn1_color': color, 'btn2_color': color,
+    'btn1_pos_size': rect, 'btn2_pos_size': rect, 'dirty_rects': flag,
+    'scale_mode': scaling, 'window_size': window, 'render_backend': backend,
+    'drop_speed': positive, 'banana_speed': number, 'speed_increase': nonnegative,
+    'weights_per_level': positive_integer, 'banana_pad_top': nonnegative,
+    'banana_pad_side': nonnegative, 'basket_pad_top': nonnegative,
+    'basket_pad_side': nonnegative, 'pixel_collisions': flag, 'score_for_weight16': number,
+    'score_for_weight8': number, 'FPS': positive, 'tick_rate': rate,
+    'idle_timeout': positive_integer, 'profile': flag, 'report_startup': flag,
+    'report_latency': flag, 'profile_history': positive_integer, 'profile_output': text,
+    'record': text, 'record_seed': seed, 'scores_dir': text,
+    'high_scores': nonnegative_integer, 'egg_number': positive_integer,
+    'grid_cell_size': positive_integer, 'swarm_size': nonnegative_integer,
+    'swarm_weights': fraction, 'swarm_catches': positive_integer,
+    'asset_budget': nonnegative, 'crash_sound': text, 'fail_sound': text,
+    'level_up_sound': text, 'sound_channels': positive_integer,
+    'sound_instances': positive_integer,
+}
+# The settings that are only read when the game starts (reloading
+# config.py doesn't change the profiler, the recorder or the score
+# store that are already set up):
+RESTART = ('profile', 'profile_history', 'record', 'record_seed', 'scores_dir')
+
+
+class LevelSettings:
+
+    """
+    The settings of one level (its number, the speed things fall at,
+    how many of them it takes to clear it, and what they score), worked
+    out once for the level table of Settings.
+    """
+
+    __slots__ = ('number', 'speed', 'weights_per_level', 'egg_number',
+                 'score_for_weight16', 'score_for_weight8', 'swarm_size',
+                 'swarm_weights', 'swarm_catches')
+
+    def __init__(self, settings, number):
+        self.number = number
+        # One speed_increase added for each level above 1:
+        self.speed = settings.drop_speed + (number - 1) * settings.speed_increase
+        self.weights_per_level = settings.weights_per_level
+        self.egg_number = settings.egg_number
+        self.score_for_weight16 = settings.score_for_weight16
+        self.score_for_weight8 = settings.score_for_weight8
+        self.swarm_size = settings.swarm_size
+        self.swarm_weights = settings.swarm_weights
+        self.swarm_catches = settings.swarm_catches
+
+
+class Settings:
+
+    """
+    The settings of config.py, checked and loaded once, along with what
+    the game works out from them: the screen and play area rects (the
+    screen less the margin, which the sprites move within), the length
+    of a tick (dt) and a table of the settings of each level. They are
+    read-only; to change a setting, make a new Settings object with
+    replace.
+    """
+
+    __slots__ = tuple(FIELDS) + ('screen_rect', 'area', 'dt', 'levels', 'mtime')
+
+    def __init__(self, values, mtime=None):
+        init = object.__setattr__  # Settings can only be set here
+        for name, check in FIELDS.items():
+            if name not in values:
+                raise ValueError('config.py has no setting named {!r}'.format(name))
+            value = values[name]
+            if isinstance(value, list):
+                value = tuple(value)
+            if not check(value):
+                raise ValueError('config.py setting {} = {!r} fails the {} check'.format(name, value, check.__name__))
+            init(self, name, value)
+        init(self, 'screen_rect', pygame.Rect((0, 0), self.screen_size))
+        shrink = -self.margin * 2
+        init(self, 'area', self.screen_rect.inflate(shrink, shrink))
+        init(self, 'dt', 1 / self.tick_rate)
+        init(self, 'levels', tuple(LevelSettings(self, n) for n in range(1, TABLE_LEVELS + 1)))
+        init(self, 'mtime', mtime)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('settings are read-only (use replace)')
+
+    def values(self):
+        """
+        Returns the settings from config.py, by name.
+        """
+        return {name: getattr(self, name) for name in FIELDS}
+
+    def replace(self, **changes):
+        """
+        Returns new settings, with the given ones changed.
+        """
+        return Settings(dict(self.values(), **changes), self.mtime)
+
+    def level(self, number):
+        """
+        Returns the LevelSettings of the level with the given number.
+        """
+        if number <= len(self.levels):
+            return self.levels[number - 1]
+        return LevelSettings(self, number)
+
+
+def load(name=CONFIG_FILE):
+    """
+    Runs the configuration file name, and returns its settings. If the
+    file is missing, the config module bundled with the game is used
+    (and never reloaded).
+    """
+    try:
+        mtime = os.stat(name).st_mtime
+    except OSError:
+        import config
+        return Settings(vars(config))
+    return Settings(runpy.run_path(name), mtime)
+
+
+# The settings in use:
+current = load()
+
+
+def use(settings):
+    """
+    Makes settings the ones in use (e.g., with some of them changed
+    for a benchmark).
+    """
+    global current
+    current = settings
+
+
+def reload(name=CONFIG_FILE):
+    """
+    Loads the configuration file again if it has changed on disk since
+    the settings in use were loaded, so it can be edited while the
+    game runs. Returns true if the settings changed. Settings that are
+    wrong are reported and left as they were. Changes to the settings
+    in RESTART are reported too, since the game only reads them when
+    it starts.
+    """
+    try:
+        mtime = os.stat(name).st_mtime
+    except OSError:
+        return False
+    if mtime == current.mtime:
+        return False
+    try:
+        settings = load(name)
+    except Exception as error:  # Anything config.py itself may raise
+        print('Not reloading {}: {}'.format(name, error))
+        # Don't report it again until the file changes:
+        use(Settings(current.values(), mtime))
+        return False
+    changed = [field for field in RESTART if getattr(settings, field) != getattr(current, field)]
+    if changed:
+        print('Reloaded {}, but {} only change when the game is restarted'.format(name, ', '.join(changed)))
+    use(settings)
+    return True
@@ -0,0 +1,147 @@
+import os
+import random
+
+# Without a window and sound card, SDL has to use its dummy drivers.
+# These must be chosen before pygame.display is initialized, and so
+# must leaving SIGINT and SIGTERM alone: SDL would turn them into quit
+# events, which nothing reads without a window, so Ctrl-C and kill
+# wouldn't stop a headless tool (e.g., the server):
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('SDL_NO_SIGNAL_HANDLERS', '1')
+
+import pygame
+import settings
+
+from squish import BananaLevel, BasketLevel, SwarmLevel
+
+"This module contains a headless simulation environment for the Squish game."
+
+# The level class for each game mode:
+LEVELS = {0: BananaLevel, 1: BasketLevel, 2: SwarmLevel}
+
+
+def init():
+    """
+    Sets up the (invisible) display the sprites need for converting
+    their images and finding the area they may move in. Does nothing
+    if the game already has a display.
+    """
+    if pygame.display.get_surface() is None:
+        # Move to the directory where the images are located, as Game
+        # does:
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        pygame.display.init()
+        pygame.display.set_mode(settings.current.screen_size)
+
+
+class Env:
+
+    """
+    A single headless game in the given mode (0 for banana mode, 1 for
+    basket mode, 2 for the swarm event level of basket mode). The game
+    is driven through reset and step, with the horizontal position of
+    the catcher given to step instead of being read from the mouse.
+    Cleared levels are followed by the next level right away (with the
+    lives restored, as in the game), and the game is done when the
+    player runs out of lives.
+    """
+
+    def __init__(self, mode=0, seed=None):
+        init()
+        self.mode = mode
+        self.dt = settings.current.dt
+        self.rng = random.Random(seed)
+        self.level = None
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        """
+        Starts a new game at the first level, reseeding the random
+        positions of the falling objects if a seed is given. Returns
+        the first observation.
+        """
+        if seed is not None:
+            self.rng.seed(seed)
+        if self.level is not None:
+            self.level.leave()
+        self.level = self.new_level(1, 0)
+        self.ticks = 0
+        return self.observe()
+
+    def new_level(self, number, score):
+        level = LEVELS[self.mode](self.mode, number, score, rng=self.rng)
+        level.quiet = True
+        return level
+
+    def step(self, x):
+        """
+        Moves the game one tick (1 / config.tick_rate seconds) forward
+        with the catcher at x. Returns the points scored during the
+        tick and whether the game is over.
+        """
+        level = self.level
+        score = level.score
+        level.step(x, self.dt)
+        self.ticks += 1
+        if level.lives <= 0:
+            return level.score - score, True
+        if level.remaining <= 0:
+            level.leave()
+            self.level = self.new_level(level.number + 1, level.score)
+        return level.score - score, False
+
+    def observe(self):
+        """
+        Returns the state of the game as a tuple of the catcher's
+        center x-coordinate, a list of the (x, y) centers of the falling
+        objects, the score, the lives left and the level number.
+        """
+        level = self.level
+        return (level.catcher.rect.centerx,
+                level.positions(),
+                level.score, level.lives, level.number)
+
+
+class VecEnv:
+
+    """
+    A number of independent headless games that are stepped in
+    lockstep. Game i is seeded with seed + i, so a batch is
+    reproducible from a single seed. A game that is over is reset
+    automatically by the step that ended it.
+    """
+
+    def __init__(self, n, mode=0, seed=0):
+        self.envs = [Env(mode, seed + i) for i in range(n)]
+
+    def __len__(self):
+        return len(self.envs)
+
+    def reset(self):
+        """
+        Restarts all the games and returns their observations.
+        """
+        return [env.reset() for env in self.envs]
+
+    def step(self, xs):
+        """
+        Moves every game one tick forward, game i with its catcher at
+        xs[i]. Returns a list of the points scored in each game and a
+        list telling which games ended (and were restarted).
+        """
+        rewards = []
+        dones = []
+        for env, x in zip(self.envs, xs):
+            reward, done = env.step(x)
+            if done:
+                env.reset()
+            rewards.append(reward)
+            dones.append(done)
+        return rewards, dones
+
+    def observe(self):
+        """
+        Returns the observations of all the games.
+        """
+        return [env.observe() for env in self.envs]
@@ -0,0 +1,144 @@
+import argparse
+import gc
+import sys
+import tracemalloc
+
+import sim  # First, so the game runs on SDL's dummy drivers
+import pygame
+import settings
+import squish
+
+from audio import audio
+from memory import memory
+from pool import pool
+from present import presenter
+
+"This module contains the memory soak test of the Squish game."
+
+
+class Dummy:
+    """
+    Stands in for the Game object the states tell about the next state.
+    """
+    next_state = None
+    recorder = None
+    pointer = 0, 0
+
+
+def play(level, screen, ticks):
+    """
+    Displays a level and plays it for at most the given number of
+    ticks (until it tells the game to move on), with the catcher
+    sweeping across the screen. Returns the state the level moved on
+    to, or None.
+    """
+    game = Dummy()
+    level.first_display(screen)
+    width = screen.get_width()
+    for tick in range(ticks):
+        game.pointer = tick * 7 % width, 0
+        level.update(game)
+        level.interpolate(1.0)
+        level.display(screen)
+        if game.next_state is not None:
+            break
+    level.leave()
+    return game.next_state
+
+
+def cycle(screen, mode, ticks):
+    """
+    Goes once through the states of a game, displaying each of them:
+    StartUp, the first level, LevelCleared, the next level and GameOver.
+    The levels are played for at most ticks ticks each; a level that is
+    still going then is left as if it had ended the usual way.
+    """
+    squish.StartUp().first_display(screen)
+    level = sim.LEVELS[mode](mode)
+    play(level, screen, ticks)
+    cleared = squish.LevelCleared(mode, level.number, level.score)
+    cleared.first_display(screen)
+    play(cleared.next_state(), screen, ticks)
+    squish.GameOver(mode).first_display(screen)
+
+
+def measure():
+    """
+    Returns the live objects tracked by the memory ledger (as
+    Ledger.totals does), the bytes allocated by Python and the number of
+    sprites built by the pool, after a full garbage collection.
+    """
+    gc.collect()
+    return memory.totals(), tracemalloc.get_traced_memory()[0], pool.created
+
+
+def report(before, after):
+    """
+    Prints the live objects and bytes of each owner before and after,
+    and returns the growth of the tracked bytes and of the Python heap.
+    """
+    (owners_before, heap_before, created_before), (owners_after, heap_after, created_after) = before, after
+    print('{:16} {:>8} {:>12} {:>8} {:>12} {:>10}'.format(
+        'owner', 'objects', 'bytes', 'objects', 'bytes', 'growth'))
+    for owner in sorted(set(owners_before) | set(owners_after)):
+        count_before, size_before = owners_before.get(owner, (0, 0))
+        count_after, size_after = owners_after.get(owner, (0, 0))
+        print('{:16} {:8} {:12} {:8} {:12} {:+10}'.format(
+            owner, count_before, size_before, count_after, size_after, size_after - size_before))
+    tracked = (sum(size for _, size in owners_after.values()) -
+               sum(size for _, size in owners_before.values()))
+    print('tracked bytes {:+}, Python heap {:+} bytes, sprites built {:+}'.format(
+        tracked, heap_after - heap_before, created_after - created_before))
+    return tracked, heap_after - heap_before
+
+
+def run(cycles, modes, ticks, warmup, every):
+    """
+    Runs the given number of cycles (see cycle), going through the
+    modes in turn, after warmup cycles to fill the caches. Prints the
+    memory in use every so many cycles, and returns the measurements
+    after the warmup and at the end.
+    """
+    sim.init()
+    pygame.font.init()
+    pygame.mixer.init()
+    audio.init()
+    screen = presenter.open(settings.current.screen_size)
+    tracemalloc.start()
+    for number in range(warmup):
+        cycle(screen, modes[number % len(modes)], ticks)
+    before = measure()
+    for number in range(cycles):
+        cycle(screen, modes[number % len(modes)], ticks)
+        if every and (number + 1) % every == 0:
+            owners, heap, created = measure()
+            print('cycle {:6}: {:6} objects, {:10} bytes tracked, Python heap {:10} bytes, {} sprites built'.format(
+                number + 1, sum(count for count, _ in owners.values()),
+                sum(size for _, size in owners.values()), heap, created), flush=True)
+    after = measure()
+    tracemalloc.stop()
+    return before, after
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Cycle through the Squish game states headlessly, and report memory growth.')
+    parser.add_argument('--cycles', type=int, default=1000, help='cycles through the states to run')
+    parser.add_argument('--mode', type=int, action='append', help='game modes to play (default: 0 and 1)')
+    parser.add_argument('--ticks', type=int, default=120, help='ticks to play each level for (at most)')
+    parser.add_argument('--warmup', type=int, default=20, help='cycles to run before measuring')
+    parser.add_argument('--every', type=int, default=100, help='cycles between progress lines (0 for none)')
+    parser.add_argument('--max-growth', type=int, default=1 << 20, metavar='BYTES',
+                        help='fail if the tracked bytes or the Python heap grow by more than this')
+    options = parser.parse_args(args)
+
+    before, after = run(options.cycles, options.mode or [0, 1], options.ticks, options.warmup, options.every)
+    tracked, heap = report(before, after)
+    if tracked > options.max_growth or heap > options.max_growth:
+        print('FAIL: memory grew by more than {} bytes'.format(options.max_growth))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"This module contains the broad-phase collision index of the Squish game."
+
+
+class ColumnGrid:
+
+    """
+    A uniform grid of vertical columns (bands of cell_size pixels)
+    that the falling objects are bucketed into by their rects. A query
+    only looks at the columns a rect spans, and returns each object in
+    them once, however many columns it is in.
+    """
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def clear(self):
+        """
+        Empties all the columns (e.g., before the next tick).
+        """
+        self.cells.clear()
+
+    def columns(self, rect):
+        return range(rect.left // self.cell_size, (rect.right - 1) // self.cell_size + 1)
+
+    def insert(self, sprite):
+        """
+        Adds a sprite to every column its rect spans.
+        """
+        cells = self.cells
+        for column in self.columns(sprite.rect):
+            cell = cells.get(column)
+            if cell is None:
+                cells[column] = [sprite]
+            else:
+                cell.append(sprite)
+
+    def query(self, rect):
+        """
+        Returns the sprites in the columns spanned by rect whose rects
+        overlap it.
+        """
+        found = []
+        seen = set()
+        cells = self.cells
+        for column in self.columns(rect):
+            for sprite in cells.get(column, ()):
+                if sprite not in seen:
+                    seen.add(sprite)
+                    if rect.colliderect(sprite.rect):
+                        found.append(sprite)
+        return found
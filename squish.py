@@ -1,11 +1,27 @@
 import os
 import pygame
+import random
 import sys
+import time
 
 from pygame.locals import *
 
-import config
+import atlas
 import objects
+import settings
+
+from assets import assets
+from audio import audio
+from hud import hud
+from inputs import EXPOSE, inputs
+from memory import memory
+from pool import pool
+from present import presenter
+from profiler import FrameProfiler, counters
+from replay import Recorder
+from scores import CLEARED, OVER, scores
+from spatial import ColumnGrid
+from swarm import EGG, Swarm
 
 "This module contains the main game logic of the Squish game."
 
@@ -17,6 +33,11 @@ class State:
     itself on a given surface.
     """
 
+    # Does the state change on its own (and not only on events)? States
+    # that don't are only woken up by events, instead of being updated
+    # and displayed config.FPS times per second:
+    animated = True
+
     def handle(self, event):
         """
         Default event handling only deals with quitting.
@@ -31,9 +52,19 @@ class State:
         Used to display the State for the first time. Fills the screen
         with the background color.
         """
-        screen.fill(config.background_color)
+        screen.fill(settings.current.background_color)
         # Remember to call flip, to make the changes visible:
-        pygame.display.flip()
+        presenter.flip()
+        counters.presents += 1
+
+    def interpolate(self, alpha):
+        """
+        Used to place the sprites alpha (between 0 and 1) of the way
+        from the previous update to the latest one, before the State is
+        displayed between two updates. The default behavior is to do
+        nothing.
+        """
+        pass
 
     def display(self, screen):
         """
@@ -42,6 +73,14 @@ class State:
         """
         pass
 
+    def leave(self):
+        """
+        Used when the game moves on to another State, which this one
+        must not be displayed again after. The default behavior is to
+        do nothing.
+        """
+        pass
+
 
 class Paused(State):
     """
@@ -52,6 +91,8 @@ class Paused(State):
     finished = 0  # Has the user ended the pause?
     image = None  # Set this to a file name if you want an image
     text = ''    # Set this to some informative text
+    animated = False
+    rendered = {}  # Rendered lines of text, shared by all paused states
 
     def handle(self, event):
         """
@@ -80,10 +121,11 @@ class Paused(State):
         (if any) and render the text.
         """
         # First, clear the screen by filling it with the background color:
-        screen.fill(config.background_color)
+        screen.fill(settings.current.background_color)
 
-        # Create a Font object that uses an exogenous font and a specified font size:
-        font = pygame.font.Font(config.font_path, config.font_size)
+        # Get the (cached) Font object that uses an exogenous font and a
+        # specified font size:
+        font = assets.font(settings.current.font_path, settings.current.font_size)
 
         # Get the lines of text in self.text, ignoring empty lines at
         # the top or bottom:
@@ -99,8 +141,8 @@ class Paused(State):
 
         # If there is an image to display...
         if self.image:
-            # load it:
-            image = pygame.image.load(self.image).convert()
+            # load it (or get it from the cache):
+            image = assets.image(self.image, colorkey=None)
             # get its rect:
             r = image.get_rect()
             # move the text down by half the image height:
@@ -109,6 +151,7 @@ class Paused(State):
             r.midbottom = center, top - 20
             # blit the image to the screen:
             screen.blit(image, r)
+            counters.blits += 1
 
         antialias = True   # Smooth the text
         black = 0, 0, 0  # Render it as black
@@ -116,14 +159,20 @@ class Paused(State):
         # Render all the lines, starting at the calculated top, and
         # move down font.get_linesize() pixels for each line:
         for line in lines:
-            text = font.render(line.strip(), antialias, black)
+            line = line.strip()
+            text = self.rendered.get(line)
+            if text is None:
+                text = font.render(line, antialias, black)
+                self.rendered[line] = memory.track(text, type(self).__name__)
             r = text.get_rect()
             r.midtop = center, top
             screen.blit(text, r)
             top += font.get_linesize()
+        counters.blits += len(lines)
 
         # Display all the changes:
-        pygame.display.flip()
+        presenter.flip()
+        counters.presents += 1
 
     def next_state(self):
         pass
@@ -136,21 +185,30 @@ class StartUp(Paused):
     or in a basket mode with the aim of catching all the falling eggs.
     """
 
-    image = config.splash_image
+    image = settings.current.splash_image
 
     def __init__(self):
         self.next_state = None
         self.btn_x1, self.btn_y1, self.btn_x2, self.btn_y2 = 200, 500, 620, 500
         self.btn_w, self.btn_h = 200, 50
 
-    def display(self, screen):
+    labels = None  # The rendered button labels (once for all)
 
-        font = pygame.font.Font(config.font_path, 30)
+    def first_display(self, screen):
+        """
+        Draws the splash image and the buttons. They are drawn only
+        once, since nothing on the menu changes until it is left.
+        """
+        super().first_display(screen)
+
+        if StartUp.labels is None:
+            font = assets.font(settings.current.font_path, 30)
+            StartUp.labels = (memory.track(font.render("Banana Mode", True, (255, 255, 255)), 'StartUp'),
+                              memory.track(font.render("Basket Mode", True, (255, 255, 255)), 'StartUp'))
+        text1, text2 = StartUp.labels
 
-        pygame.draw.rect(screen, config.btn1_color, (self.btn_x1, self.btn_y1, self.btn_w, self.btn_h))
-        pygame.draw.rect(screen, config.btn2_color, (self.btn_x2, self.btn_y2, self.btn_w, self.btn_h))
-        text1 = font.render("Banana Mode", True, (255, 255, 255))
-        text2 = font.render("Basket Mode", True, (255, 255, 255))
+        button1 = pygame.draw.rect(screen, settings.current.btn1_color, (self.btn_x1, self.btn_y1, self.btn_w, self.btn_h))
+        button2 = pygame.draw.rect(screen, settings.current.btn2_color, (self.btn_x2, self.btn_y2, self.btn_w, self.btn_h))
         tw1, th1 = text1.get_size()
         tw2, th2 = text2.get_size()
         tx1 = self.btn_x1 + self.btn_w / 2 - tw1 / 2
@@ -159,14 +217,30 @@ class StartUp(Paused):
         tx2 = self.btn_x2 + self.btn_w / 2 - tw2 / 2
         ty2 = self.btn_y2 + self.btn_h / 2 - th2 / 2
         screen.blit(text2, (tx2, ty2))
-
-        pygame.display.update()
-        pygame.display.flip()
+        counters.blits += 2
+
+        rects = [button1, button2]
+        # The best games of each mode go below its button:
+        count = settings.current.high_scores
+        if count:
+            font = assets.font(settings.current.font_path, 20)
+            for mode, left in enumerate([self.btn_x1, self.btn_x2]):
+                top = self.btn_y1 + self.btn_h + 10
+                for rank, (score, number, _) in enumerate(scores.top(mode, count), 1):
+                    text = font.render('{}. {}  (level {})'.format(rank, score, number), True, (0, 0, 0))
+                    memory.track(text, 'StartUp')
+                    rects.append(screen.blit(text, (left, top)))
+                    top += font.get_linesize()
+        counters.blits += len(rects) - 2
+
+        presenter.update(rects)
+        counters.presents += 1
+        counters.rects += len(rects)
 
     def handle(self, event):
         super().handle(event)
         if event.type == pygame.MOUSEBUTTONDOWN:
-            mouse_x, mouse_y = event.pos
+            mouse_x, mouse_y = presenter.to_screen(event.pos)
             if self.btn_x1 <= mouse_x <= self.btn_x1 + self.btn_w and \
                     self.btn_y1 <= mouse_y <= self.btn_y1 + self.btn_h:
                 pygame.mouse.set_visible(False)
@@ -179,16 +253,173 @@ class StartUp(Paused):
                 self.next_state = StartUp
 
 
-class BananaLevel(State):
+class Level(State):
+    """
+    Generic superclass for the game levels. It takes care of drawing
+    the sprites in self.sprites and the score and lives of the player.
+    With config.dirty_rects set, only the parts of the screen that have
+    changed since the previous frame are redrawn and pushed to the
+    display: the sprites are erased by copying their old rects from a
+    cached background, and the score and lives are only redrawn when
+    they change.
+    """
+
+    score = 0
+    lives = 0
+    remaining = 0
+    ticks = 0  # Ticks played (for the session stats)
+    grid = ColumnGrid(settings.current.grid_cell_size)  # Shared, cleared every tick
+    quiet = False  # Set to true to play no sounds (e.g., when headless)
+
+    def update(self, game):
+        """
+        Updates the game state one fixed tick (1 / config.tick_rate
+        seconds) from the previous one, with the catcher following the
+        mouse. When the player runs out of lives,
+        tell the game to switch to a GameOver state; when all the
+        objects of this level have been dealt with, to a LevelCleared
+        state. Either way, the result is saved (see scores.py). The
+        mouse position is the one the game sampled for the tick (see
+        inputs.py).
+        """
+        x = game.pointer[0]
+        if game.recorder:
+            game.recorder.tick(x)
+        self.step(x, settings.current.dt)
+        self.ticks += 1
+        if self.lives <= 0:
+            scores.add(self.mode, OVER, self.number, self.score, self.ticks * settings.current.dt)
+            game.next_state = GameOver(mode=self.mode)
+        elif self.remaining <= 0:
+            scores.add(self.mode, CLEARED, self.number, self.score, self.ticks * settings.current.dt)
+            game.next_state = LevelCleared(mode=self.mode, number=self.number, score=self.score)
+
+    def step(self, x, dt):
+        """
+        Moves the game dt seconds forward, with the catcher (the banana
+        or the basket) at the horizontal position x. This is all of the
+        game logic, and it doesn't touch the mouse, the display or the
+        game's states, so it can be run without a window (see sim.py).
+        Should be implemented by subclasses.
+        """
+        pass
+
+    def leave(self):
+        """
+        Gives the sprites of the level back to the pool, for the next
+        level to reuse.
+        """
+        pool.release(self.sprites)
+
+    def collisions(self):
+        """
+        Returns the falling objects that touch the catcher, testing
+        each of them at most once. Only the objects that have reached
+        the catcher's height are put into a grid of columns, and only
+        those in the columns the catcher spans are tested, so the cost
+        stays flat however many objects there are. With
+        config.pixel_collisions set, the objects whose rects overlap
+        the catcher's are then tested pixel for pixel (see
+        SquishSprite.overlaps); otherwise the catcher's padded bounds
+        are used.
+        """
+        catcher = self.catcher
+        pixel = settings.current.pixel_collisions
+        bounds = catcher.rect if pixel else catcher.bounds()
+        grid = self.grid
+        grid.clear()
+        for sprite in self.falling:
+            if sprite.rect.bottom > bounds.top:
+                grid.insert(sprite)
+        hits = grid.query(bounds)
+        if pixel:
+            hits = [sprite for sprite in hits if catcher.overlaps(sprite)]
+        return hits
+
+    def positions(self):
+        """
+        Returns the (x, y) centers of the falling objects.
+        """
+        return [sprite.rect.center for sprite in self.falling]
+
+    def interpolate(self, alpha):
+        """
+        Draws the falling objects between where they were at the
+        previous tick and where they are now, so they move smoothly
+        when frames and ticks don't line up. The next step puts them
+        back where they really are.
+        """
+        for sprite in self.falling:
+            sprite.rect.top = round(sprite.prev_y + (sprite.y - sprite.prev_y) * alpha)
+
+    def play(self, sound):
+        """
+        Plays the sound in the given file, unless the level is quiet.
+        """
+        if not self.quiet:
+            audio.play(sound)
+
+    def first_display(self, screen):
+        """
+        Wipes the screen and remembers the empty playing field as the
+        background to erase the sprites with.
+        """
+        screen.fill(settings.current.background_color)
+        self.background = memory.track(screen.copy(), type(self).__name__)
+        hud.reset()
+        presenter.flip()
+        counters.presents += 1
+
+    def display(self, screen):
+        """
+        Displays the state after the first display (which simply wipes
+        the screen). As opposed to first_display, this method only
+        presents a list of rectangles that need to be updated, supplied
+        from self.sprites.draw and the HUD.
+        """
+        if presenter.renderer is not None:
+            # The sprites are drawn as textures over the background
+            # (which holds the score and lives):
+            changed = hud.update(self.background, self.score, self.lives)
+            presenter.render(self.background, changed, [(sprite.image, sprite.rect) for sprite in self.sprites])
+            counters.blits += len(self.sprites) + 1
+            counters.presents += 1
+            return
+
+        if not settings.current.dirty_rects:
+            screen.fill(settings.current.background_color)
+            self.sprites.draw(screen)
+            hud.draw(screen, self.score, self.lives)
+            presenter.flip()
+            counters.blits += len(self.sprites) + 2
+            counters.presents += 1
+            return
+
+        # Erase the sprites where they were drawn in the previous frame:
+        self.sprites.clear(screen, self.background)
+
+        # The score and lives are part of the background, so that
+        # erasing a sprite that passes over them restores them:
+        updates = hud.update(self.background, self.score, self.lives)
+        for rect in updates:
+            screen.blit(self.background, rect, rect)
+
+        # The old and the new rects of the sprites that moved:
+        updates += self.sprites.draw(screen)
+        presenter.update(updates)
+        counters.blits += 2 * len(self.sprites) + len(updates)
+        counters.presents += 1
+        counters.rects += len(updates)
+
+
+class BananaLevel(Level):
     """
     A game level. Takes care of counting how many weights have been
     dropped, moving the sprites around, and other tasks relating to
     game logic.
     """
 
-    def __init__(self, mode=0, number=1, score=0, lives=5):
-
-        self.crashsound = None
+    def __init__(self, mode=0, number=1, score=0, lives=5, rng=random):
 
         self.mode = mode  # 0 for banana mode, 1 for basket mode
         # Default weight initial falling speed auxiliary parameter
@@ -197,90 +428,63 @@ class BananaLevel(State):
         self.score = score
         # Initial lives for player
         self.lives = lives
+        # The speed and scores of this level, from the level table:
+        self.params = settings.current.level(number)
         # How many weights remain to dodge in this level?
-        self.remaining = config.weights_per_level
-
-        #  Default weight falling speed initial increment parameter
-        speed = config.drop_speed
-        # One speed_increase added for each level above 1:
-        speed += (self.number-1) * config.speed_increase
-        # Create the weight and banana:
-        self.weight1 = objects.Weight1(speed)
-        self.weight2 = objects.Weight2(speed)
-        self.banana = objects.Banana()
-        sprites_container = self.weight1, self.weight2,  self.banana  # This could contain more sprites...
-        self.sprites = pygame.sprite.RenderUpdates(sprites_container)
-
-    def update(self, game):
+        self.remaining = self.params.weights_per_level
+
+        speed = self.params.speed
+        # Create the weight and banana (or reuse those of an earlier level):
+        self.weight1 = pool.get(objects.Falling, objects.KINDS['weight16'], speed, rng)
+        self.weight2 = pool.get(objects.Falling, objects.KINDS['weight8'], speed, rng)
+        self.banana = pool.get(objects.Banana)
+        self.catcher = self.banana
+        self.falling = [self.weight1, self.weight2]
+        self.sprites = pool.group(self.weight1, self.weight2, self.banana)
+
+    def step(self, x, dt):
         """
-        Updates the game state from the previous frame.
+        Moves the game dt seconds forward, with the banana at x.
         """
         # Update all sprites:
-        self.sprites.update()
-        # If the banana touches the weight, tell the game to switch to
-        # a GameOver state:
-        if self.banana.touches(self.weight1) or self.banana.touches(self.weight2):
-            self.crashsound = pygame.mixer.Sound(config.crash_sound)
-            self.crashsound.play()
-
-            if self.banana.touches(self.weight1):
-                self.lives -= 2
+        self.weight1.update(dt)
+        self.weight2.update(dt)
+        self.banana.update(x)
+        # If the banana touches the weight, the player loses lives:
+        hits = self.collisions()
+        if hits:
+            self.play(settings.current.crash_sound)
+
+            if self.weight1 in hits:
+                self.lives -= self.weight1.kind.damage
                 self.weight1.reset()
-            elif self.banana.touches(self.weight2):
-                self.lives -= 1
+            elif self.weight2 in hits:
+                self.lives -= self.weight2.kind.damage
                 self.weight2.reset()
 
-            if self.lives <= 0:
-                game.next_state = GameOver(mode=self.mode)
-
-        # Otherwise, if the weight has landed, reset it. If all the
-        # weights of this level have been dodged, tell the game to
-        # switch to a LevelCleared state:
+        # Otherwise, if the weight has landed, reset it and count it
+        # as dodged:
         elif self.weight1.landed or self.weight2.landed:
 
             if self.weight1.landed:
-                self.score += config.score_for_weight16
+                self.score += self.params.score_for_weight16
                 self.weight1.reset()
                 self.remaining -= 1
 
             if self.weight2.landed:
-                self.score += config.score_for_weight8
+                self.score += self.params.score_for_weight8
                 self.weight2.reset()
                 self.remaining -= 1
 
-            if self.remaining == 0:
-                game.next_state = LevelCleared(mode=self.mode, number=self.number, score=self.score)
-
-    def display(self, screen):
-        """
-        Displays the state after the first display (which simply wipes
-        the screen). As opposed to firstDisplay, this method uses
-        pygame.display.update with a list of rectangles that need to
-        be updated, supplied from self.sprites.draw.
-        """
-        screen.fill(config.background_color)
-        updates = self.sprites.draw(screen)
-        pygame.display.update(updates)
 
-        #  Show score
-        draw_score(screen, "Score:" + str(self.score), config.score_x, config.score_y)
-
-        # Show lives left
-        draw_lives(screen, self.lives, config.life_x, config.life_y, config.healthbar_image)
-
-        pygame.display.flip()
-
-
-class BasketLevel(State):
+class BasketLevel(Level):
     """
-    A game level. Takes care of counting how many weights have been
-    dropped, moving the sprites around, and other tasks relating to
+    A game level. Takes care of counting how many eggs have been
+    caught, moving the sprites around, and other tasks relating to
     game logic.
     """
 
-    def __init__(self, mode=1, number=1, score=0, lives=5):
-
-        self.crashsound = None
+    def __init__(self, mode=1, number=1, score=0, lives=5, rng=random):
 
         self.mode = mode  # mode = 1
         # Default weight initial falling speed auxiliary parameter
@@ -289,66 +493,117 @@ class BasketLevel(State):
         self.score = score
         # Initial lives for player
         self.lives = lives
-        # How many weights remain to dodge in this level?
-        self.remaining = config.weights_per_level
-
-        #  Default weight falling speed initial increment parameter
-        speed = config.drop_speed
-        # One speed_increase added for each level above 1:
-        speed += (self.number - 1) * config.speed_increase
-
-        all_sprites = pygame.sprite.Group()
-        # Create the eggs and the bucket:
-        self.eggs = [objects.Egg(speed) for _ in range(config.egg_number)]
-        self.basket = objects.Basket()
-        all_sprites.add(self.basket)
-        for egg in self.eggs:
-            all_sprites.add(egg)
-        self.sprites = pygame.sprite.RenderUpdates(all_sprites)
-        # self.weight1 = objects.Weight1(speed)
-        # self.weight2 = objects.Weight2(speed)
-        # self.banana = objects.Banana()
-        # sprites_container = self.weight1, self.weight2, self.banana  # This could contain more sprites...
-        # self.sprites = pygame.sprite.RenderUpdates(sprites_container)
-
-    def update(self, game):
+        # The speed and number of eggs of this level, from the level table:
+        self.params = settings.current.level(number)
+        # How many eggs remain to catch in this level?
+        self.remaining = self.params.weights_per_level
+
+        speed = self.params.speed
+
+        # Create the eggs and the bucket (or reuse those of an earlier level):
+        egg = objects.KINDS['egg']
+        self.eggs = [pool.get(objects.Falling, egg, speed, rng) for _ in range(self.params.egg_number)]
+        self.basket = pool.get(objects.Basket)
+        self.catcher = self.basket
+        self.falling = self.eggs
+        self.sprites = pool.group(self.basket, *self.eggs)
+
+    def step(self, x, dt):
         """
-        Updates the game state from the previous frame.
+        Moves the game dt seconds forward, with the basket at x.
         """
         # Update all sprites:
-        self.sprites.update()
+        self.basket.update(x)
+        for egg in self.eggs:
+            egg.update(dt)
         # If the basket catches an egg, get 1 score and reset the egg
+        caught = self.collisions()
         for egg in self.eggs:
-            if self.basket.touches(egg):
+            if egg in caught:
                 self.score += 1
                 self.remaining -= 1
                 egg.reset()
 
-                if self.remaining == 0:
-                    game.next_state = LevelCleared(mode=self.mode, number=self.number, score=self.score)
-
             if egg.landed:
-                self.crashsound = pygame.mixer.Sound(config.crash_sound)
-                self.crashsound.play()
+                self.play(settings.current.crash_sound)
                 self.lives -= 1
                 egg.reset()
 
-                if self.lives <= 0:
-                    game.next_state = GameOver(self.mode)
-
-    def display(self, screen):
 
-        screen.fill(config.background_color)
-        updates = self.sprites.draw(screen)
-        pygame.display.update(updates)
+class SwarmLevel(Level):
+    """
+    An event level of basket mode, with config.swarm_size eggs and
+    weights falling at once (see swarm.py). Every caught egg scores 1,
+    weights cost lives as in banana mode, and eggs that land are simply
+    dropped again. The level is cleared when config.swarm_catches eggs
+    have been caught.
+    """
 
-        #  Show score
-        draw_score(screen, "Score:" + str(self.score), config.score_x, config.score_y)
+    def __init__(self, mode=2, number=1, score=0, lives=5, rng=random):
 
-        # Show lives left
-        draw_lives(screen, self.lives, config.life_x, config.life_y, config.healthbar_image)
+        self.mode = mode  # mode = 2
+        self.number = number
+        self.score = score
+        self.lives = lives
+        self.params = settings.current.level(number)
+        # How many eggs remain to catch in this level?
+        self.remaining = self.params.swarm_catches
+
+        # Create the swarm and the basket:
+        params = self.params
+        self.swarm = Swarm(params.swarm_size, params.speed, rng, params.swarm_weights)
+        self.basket = pool.get(objects.Basket)
+        self.catcher = self.basket
+        self.falling = []
+        self.sprites = pool.group(self.basket)
+
+    def step(self, x, dt):
+        """
+        Moves the game dt seconds forward, with the basket at x.
+        """
+        swarm = self.swarm
+        self.basket.update(x)
+        landed = swarm.update(dt)
+
+        # The basket bounds, tested against all the objects at once:
+        hit = swarm.collide(self.basket.bounds())
+        if hit.any():
+            kinds = swarm.kind[hit]
+            caught = int((kinds == EGG).sum())
+            self.score += caught
+            self.remaining -= caught
+            damage = int(swarm.damage[kinds].sum())
+            if damage:
+                self.play(settings.current.crash_sound)
+                self.lives -= damage
+        swarm.reset(hit | landed)
+
+    def interpolate(self, alpha):
+        self.swarm.interpolate(alpha)
 
-        pygame.display.flip()
+    def display(self, screen):
+        """
+        With thousands of objects moving, almost all of the screen
+        changes every frame, so it is simply redrawn and flipped.
+        """
+        if presenter.renderer is not None:
+            changed = hud.update(self.background, self.score, self.lives)
+            images = self.swarm.images_and_positions()
+            images += [(sprite.image, sprite.rect) for sprite in self.sprites]
+            presenter.render(self.background, changed, images)
+            counters.blits += len(images) + 1
+            counters.presents += 1
+            return
+        screen.fill(settings.current.background_color)
+        hud.draw(screen, self.score, self.lives)
+        self.swarm.draw(screen)
+        self.sprites.draw(screen)
+        presenter.flip()
+        counters.blits += len(self.swarm) + len(self.sprites) + 2
+        counters.presents += 1
+
+    def positions(self):
+        return self.swarm.positions()
 
 
 class Banana_Info(Paused):
@@ -372,10 +627,10 @@ class Basket_Info(Paused):
 
     """
     A simple paused state that displays some information about the
-    game. It is followed by a BasketLevel state (the first level).
+    game. It is followed by a BasketLevel state (the first level), or
+    a SwarmLevel state in swarm mode.
     """
 
-    next_state = BasketLevel
     text = '''
     In this game you are a basket, 
     attempting to catch eggs that are 
@@ -387,6 +642,12 @@ class Basket_Info(Paused):
     otherwise go uncaught.
     (Click to continue)'''
 
+    def next_state(self):
+        # With a swarm size configured, basket mode is an event level:
+        if settings.current.swarm_size:
+            return SwarmLevel()
+        return BasketLevel()
+
 
 class Banana_StartUp(Paused):
 
@@ -396,7 +657,7 @@ class Banana_StartUp(Paused):
     """
 
     next_state = Banana_Info
-    image = config.splash_image
+    image = settings.current.splash_image
     text = '''
     Welcome to Squish,
     the game of Fruit Self-Defense
@@ -411,7 +672,7 @@ class Basket_StartUp(Paused):
     """
 
     next_state = Basket_Info
-    image = config.splash_image
+    image = settings.current.splash_image
     text = '''
     Welcome to Squish,
     the game of Egg Catcher
@@ -425,8 +686,7 @@ class LevelCleared(Paused):
     """
 
     def __init__(self, mode, number, score):
-        self.level_up_sound = pygame.mixer.Sound(config.level_up_sound)
-        self.level_up_sound.play()
+        audio.play(settings.current.level_up_sound)
 
         self.mode = mode
         self.number = number
@@ -439,6 +699,8 @@ class LevelCleared(Paused):
             return BananaLevel(self.mode, self.number + 1, self.score)
         elif self.mode == 1:
             return BasketLevel(self.mode, self.number + 1, self.score)
+        elif self.mode == 2:
+            return SwarmLevel(self.mode, self.number + 1, self.score)
 
 
 class GameOver(Paused):
@@ -447,48 +709,31 @@ class GameOver(Paused):
     game. It is followed by the first level.
     """
     def __init__(self, mode):
-        self.failsound = pygame.mixer.Sound(config.fail_sound)
-        self.failsound.play()
+        audio.play(settings.current.fail_sound)
         self.mode = mode
 
         if self.mode == 0:
             self.next_state = BananaLevel
         elif self.mode == 1:
             self.next_state = BasketLevel
+        elif self.mode == 2:
+            self.next_state = SwarmLevel
 
     text = '''
     Game Over
     Click or press any key to Restart, Esc to Quit'''
 
 
-def draw_score(surf, text: str, x, y):
+def configure():
     """
-    Display the score in real time,
-    the score will be added when the difficulty level increases,
-    if the player dies, the score will be cleared.
+    Makes the states follow the settings in use (e.g., when config.py
+    has been reloaded): the splash image, the collision grid and the
+    rendered texts.
     """
-    font = pygame.font.Font(config.font_path, config.score_font_size)
-    text_surface = font.render(text, True, config.font_color)
-    text_rect = text_surface.get_rect()
-    text_rect.midtop = (x, y)
-    surf.blit(text_surface, text_rect)
-
-
-def draw_lives(surf, live, x, y, img):
-    """
-    Show how many lives the player has left.
-    """
-    healthbar_img = pygame.image.load(img).convert()
-    healthbar_img = pygame.transform.scale(healthbar_img, (25, 25))
-    healthbar_img.set_colorkey((255, 255, 255))  # Transparent background colour (white here)
-    if live > 0:
-        for i in range(live):
-            img_rect = healthbar_img.get_rect()
-            img_rect.x = x + 30 * i
-            img_rect.y = y
-            surf.blit(healthbar_img, img_rect)
-    else:
-        pass
+    StartUp.image = Banana_StartUp.image = Basket_StartUp.image = settings.current.splash_image
+    Level.grid = ColumnGrid(settings.current.grid_cell_size)
+    Paused.rendered.clear()
+    StartUp.labels = None
 
 
 class Game:
@@ -505,8 +750,15 @@ class Game:
         # Move to that directory (so that the image files may be
         # opened later on):
         os.chdir(directory)
+        # When the game was started (for reporting the time to the first
+        # frame):
+        self.started = time.perf_counter()
         # Start with no state:
         self.state = None
+        # Nothing is recorded unless config.record is set:
+        self.recorder = None
+        # Where the mouse was before the current tick (see inputs.py):
+        self.pointer = 0, 0
         # Move to StartUp in the first event loop iteration:
         self.next_state = StartUp()
 
@@ -515,37 +767,196 @@ class Game:
         This method sets things in motion. It performs some vital
         initialization tasks, and enters the main event loop.
         """
-        pygame.init()  # This is needed to initialize all the pygame modules
+        # Set the mixer up before it is initialized, so it is ready right
+        # away (instead of waiting for it), and only initialize the parts
+        # of pygame the game uses:
+        pygame.mixer.pre_init(44100, -16, 2, 512)
+        pygame.display.init()
+        pygame.font.init()
         pygame.mixer.init()
-        pygame.time.delay(1000)  # Wait 1 second for mixer to complete initialization
+        audio.init()
+        # The settings are only reloaded between levels (see below):
+        config = settings.current
         # Decide whether to display the game in a window or to use the
         # full screen:
         flag = 0                  # Default (window) mode
 
         if config.full_screen:
             flag = FULLSCREEN     # Full screen mode
-        screen_size = config.screen_size
-        screen = pygame.display.set_mode(screen_size, flag)
+        # Open the display (see present.py). With a scale mode, the game
+        # is drawn at screen_size and scaled to the window in one go, and
+        # the renderer backend draws with an SDL Renderer instead of on
+        # Surfaces. The window tuple holds the settings it was opened
+        # with, so it is only opened again when a reload changes them:
+        window = config.screen_size, config.window_size, config.scale_mode, flag, config.render_backend
+        screen = presenter.open(config.screen_size, flag, config.window_size, config.scale_mode or None,
+                                config.render_backend)
 
         pygame.display.set_caption('Squish')
+        # Only queue the events the states handle:
+        inputs.filter()
+
+        # The StartUp screen only needs the splash image and its fonts,
+        # so load just those before the first frame:
+        assets.preload(
+            images=[(config.splash_image, None, None)],
+            fonts=[(config.font_path, config.font_size),
+                   (config.font_path, config.score_font_size),
+                   (config.font_path, 30),
+                   (config.font_path, 20)])
+        # The sprite images come from the texture atlas (built, or
+        # rebuilt when an image has changed, by atlas.py), if there is one:
+        images = [config.banana_image, config.weight16_image, config.weight8_image,
+                  config.basket_image, config.egg_image, config.healthbar_image]
+        packed = config.atlas_dir, atlas.sources()
+        if config.atlas_dir:
+            assets.atlas = atlas.load()
+            if assets.atlas is not None:
+                images = []
+        # Everything else the levels need is decoded on a background
+        # thread while the menu is shown, so no image or sound has to be
+        # read from disk in the main loop:
+        assets.load_in_background(
+            images=images,
+            sounds=[config.crash_sound, config.fail_sound, config.level_up_sound])
         clock = pygame.time.Clock()
         pygame.mouse.set_visible(True)
 
+        # The game logic is updated in fixed ticks of dt seconds, however
+        # fast the frames are drawn. The accumulator holds the time that
+        # has passed but hasn't been simulated yet:
+        dt = config.dt
+        accumulator = 0.0
+        previous = time.perf_counter()
+
+        # Frame profiling (see profiler.py) costs a few checks per frame
+        # when it is turned off:
+        profiler = FrameProfiler(config.profile_history) if config.profile else None
+        self.profiler = profiler
+
+        # Record the session (see replay.py), seeding the random module
+        # before any level is set up:
+        if config.record:
+            self.recorder = Recorder(config.record, config.record_seed)
+        # The high scores are read once, and written on a background
+        # thread (see scores.py):
+        if config.scores_dir:
+            scores.open(config.scores_dir)
+
         # The main loop:
-        while True:
-            # (1) If nextState has been changed, move to the new state, and
-            #     display it (for the first time):
-            if self.state != self.next_state:
-                self.state = self.next_state
-                self.state.first_display(screen)
-            # (2) Delegate the event handling to the current state:
-            for event in pygame.event.get():
-                self.state.handle(event)
-            # (3) Update the current state:
-            self.state.update(self)
-            # (4) Display the current state:
-            self.state.display(screen)
-            clock.tick(config.FPS)
+        try:
+            while True:
+                if profiler:
+                    profiler.begin()
+                    profiler.erase(screen)
+                # (1) If nextState has been changed, move to the new state, and
+                #     display it (for the first time):
+                if self.state != self.next_state:
+                    if self.state is not None:
+                        if self.recorder and isinstance(self.state, Level):
+                            self.recorder.end(self.state)
+                        self.state.leave()
+                    self.state = self.next_state
+                    inputs.reset()
+                    # Between levels, pick up any changes to config.py (but
+                    # not while recording, since a replay uses the
+                    # settings it finds):
+                    if not isinstance(self.state, Level) and not self.recorder and settings.reload():
+                        config = settings.current
+                        dt = config.dt
+                        flag = FULLSCREEN if config.full_screen else 0
+                        if window != (config.screen_size, config.window_size, config.scale_mode, flag,
+                                      config.render_backend):
+                            window = (config.screen_size, config.window_size, config.scale_mode, flag,
+                                      config.render_backend)
+                            screen = presenter.open(config.screen_size, flag, config.window_size,
+                                                    config.scale_mode or None, config.render_backend)
+                        if packed != (config.atlas_dir, atlas.sources()):
+                            packed = config.atlas_dir, atlas.sources()
+                            assets.atlas = atlas.load() if config.atlas_dir else None
+                        # Everything else set up from the settings follows
+                        # them too, except what settings.RESTART lists (the
+                        # pooled sprites are dropped for their images):
+                        objects.configure()
+                        pool.clear()
+                        assets.configure()
+                        audio.configure()
+                        hud.configure()
+                        configure()
+                    if self.recorder and isinstance(self.state, Level):
+                        self.recorder.level(self.state)
+                    self.state.first_display(screen)
+                    if self.started is not None:
+                        if config.report_startup:
+                            print('Time to first frame: {:.0f} ms'.format(
+                                (time.perf_counter() - self.started) * 1000))
+                        self.started = None
+                    # Don't make up for the time spent before the state began:
+                    accumulator = 0.0
+                    previous = time.perf_counter()
+                # (2) Delegate the event handling to the current state (F3
+                #     shows or hides the profiler overlay, and the window is
+                #     painted again when it is uncovered). A state that
+                #     isn't animated only changes on events, so rather than
+                #     spinning, sleep until one arrives (or until
+                #     config.idle_timeout milliseconds have passed):
+                if self.state.animated:
+                    events = pygame.event.get()
+                else:
+                    events = [pygame.event.wait(config.idle_timeout)] + pygame.event.get()
+                exposed = False
+                for event in events:
+                    if profiler and event.type == KEYDOWN and event.key == K_F3:
+                        profiler.overlay = not profiler.overlay
+                    if event.type in EXPOSE:
+                        exposed = True
+                    self.state.handle(event)
+                if exposed:
+                    presenter.repaint()
+                if profiler:
+                    profiler.mark('events')
+                # (3) Update the current state once for every tick that has
+                #     passed (at most a quarter of a second's worth, so a
+                #     stalled machine doesn't have to catch up forever), or
+                #     once per wakeup if it isn't animated:
+                if self.state.animated:
+                    now = time.perf_counter()
+                    accumulator += min(now - previous, 0.25)
+                    previous = now
+                    while accumulator >= dt:
+                        # The mouse is read as late as it can be, right
+                        # before each tick:
+                        self.pointer = inputs.sample()
+                        self.state.update(self)
+                        accumulator -= dt
+                        if self.state != self.next_state:
+                            break
+                else:
+                    self.state.update(self)
+                if profiler:
+                    profiler.mark('update')
+                # (4) Display the current state, in between the last two
+                #     ticks:
+                self.state.interpolate(accumulator / dt)
+                self.state.display(screen)
+                inputs.presented()
+                if profiler:
+                    profiler.finish(screen)
+                    profiler.mark('display')
+                if self.state.animated:
+                    clock.tick(config.FPS)
+                if profiler:
+                    profiler.mark('tick')
+                    profiler.end()
+        finally:
+            if profiler and config.profile_output:
+                profiler.save(config.profile_output)
+            if config.report_latency and inputs.latencies:
+                print('Input latency: p50 {:.1f} ms  p95 {:.1f} ms  p99 {:.1f} ms ({} frames)'.format(
+                    *inputs.percentiles(), len(inputs.latencies)))
+            if self.recorder:
+                self.recorder.close()
+            scores.close()
 
 
 if __name__ == '__main__':
@@ -5,8 +5,8 @@ a = Analysis(
     ['squish.py'],
     pathex=['config.py', 'objects.py'],
     binaries=[],
-    datas=[],
-    hiddenimports=[],
+    datas=[('config.py', '.')],
+    hiddenimports=['config'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,117 @@
+import objects
+import settings
+
+from assets import assets
+
+try:
+    import numpy
+except ImportError:  # The swarm mode is simply not available without NumPy
+    numpy = None
+
+"This module contains the array-backed falling objects of the Squish swarm mode."
+
+# The kinds of objects in a swarm (see objects.KINDS), by the numbers
+# they are stored as:
+EGG, WEIGHT16, WEIGHT8 = range(3)
+KINDS = [objects.KINDS['egg'], objects.KINDS['weight16'], objects.KINDS['weight8']]
+
+
+class Swarm:
+
+    """
+    A large number of falling objects kept in NumPy arrays (x, y,
+    speed and kind) instead of one sprite each. They are moved, tested
+    for landing and tested against the catcher in a few array
+    operations per tick, and drawn with a single Surface.blits call.
+    A fraction of them (given by weights) are weights, and the rest
+    are eggs.
+    """
+
+    def __init__(self, count, speed, rng, weights=0.2):
+        if numpy is None:
+            raise RuntimeError('The swarm mode needs NumPy')
+        self.rng = numpy.random.default_rng(rng.getrandbits(64))
+        self.area = settings.current.area
+
+        self.images = [assets.image(kind.image) for kind in KINDS]
+        sizes = numpy.array([image.get_size() for image in self.images])
+        offsets = numpy.array([kind.offset for kind in KINDS])
+        self.spawn = numpy.array([kind.spawn for kind in KINDS])
+        self.damage = numpy.array([kind.damage for kind in KINDS])
+
+        # Every object keeps its kind when it is respawned:
+        kind = numpy.full(count, EGG)
+        is_weight = self.rng.random(count) < weights
+        kind[is_weight] = self.rng.choice([WEIGHT16, WEIGHT8], is_weight.sum())
+        self.kind = kind
+        self.width = sizes[kind, 0]
+        self.height = sizes[kind, 1]
+        self.speed = speed + offsets[kind]
+        self.sequence = [self.images[k] for k in kind.tolist()]
+
+        self.left = numpy.zeros(count, dtype=int)
+        self.y = numpy.zeros(count)
+        self.prev_y = numpy.zeros(count)
+        self.top = numpy.zeros(count, dtype=int)
+        self.reset(numpy.ones(count, dtype=bool))
+
+    def __len__(self):
+        return len(self.kind)
+
+    def reset(self, which):
+        """
+        Moves the objects selected by the boolean array which to the
+        top of the screen (just out of sight), at random horizontal
+        positions.
+        """
+        n = int(which.sum())
+        x = self.rng.integers(self.area.left, self.area.right, n)
+        bottom = -self.rng.integers(0, self.spawn[self.kind[which]])
+        self.left[which] = x - self.width[which] // 2
+        self.top[which] = bottom - self.height[which]
+        self.y[which] = self.prev_y[which] = self.top[which]
+
+    def update(self, dt):
+        """
+        Moves all the objects downwards for dt seconds, and returns a
+        boolean array telling which of them have landed.
+        """
+        self.prev_y[:] = self.y
+        self.y += self.speed * dt
+        numpy.rint(self.y, out=self.top, casting='unsafe')
+        return self.top >= self.area.bottom
+
+    def collide(self, rect):
+        """
+        Returns a boolean array telling which objects overlap rect.
+        """
+        return ((self.left < rect.right) & (self.left + self.width > rect.left) &
+                (self.top < rect.bottom) & (self.top + self.height > rect.top))
+
+    def interpolate(self, alpha):
+        """
+        Places the objects alpha of the way from where they were at the
+        previous update to where they are now (for drawing only).
+        """
+        y = self.prev_y + (self.y - self.prev_y) * alpha
+        numpy.rint(y, out=self.top, casting='unsafe')
+
+    def draw(self, surface):
+        """
+        Draws all the objects on surface.
+        """
+        surface.blits(self.images_and_positions(), False)
+
+    def images_and_positions(self):
+        """
+        Returns a list of the (image, (x, y)) pairs to draw all the
+        objects with.
+        """
+        return list(zip(self.sequence, zip(self.left.tolist(), self.top.tolist())))
+
+    def positions(self):
+        """
+        Returns the (x, y) centers of all the objects.
+        """
+        return list(zip((self.left + self.width // 2).tolist(),
+                        (self.top + self.height // 2).tolist()))
@@ -0,0 +1,159 @@
+import argparse
+import ast
+import csv
+import itertools
+import multiprocessing
+import random
+import sys
+
+import sim  # First, so the game runs on SDL's dummy drivers
+import settings
+
+from pool import pool
+
+"This module contains the difficulty tuning sweeps of the Squish game."
+
+FIELDS = ['mode', 'player', 'seed', 'survival', 'score', 'level']
+
+
+def random_player(mode, seed):
+    """
+    Returns a player that wanders to a new random position now and
+    then (about twice a second).
+    """
+    rng = random.Random(seed)
+    target = [rng.randrange(settings.current.screen_size[0])]
+
+    def play(observation):
+        if rng.random() < 2 / settings.current.tick_rate:
+            target[0] = rng.randrange(settings.current.screen_size[0])
+        return target[0]
+    return play
+
+
+def scripted_player(mode, seed):
+    """
+    Returns a player that follows the lowest falling object that is
+    still above it: to catch it in basket mode, or to stand clear of it
+    in banana mode.
+    """
+    def play(observation):
+        x, positions, _, _, _ = observation
+        bottom = settings.current.screen_size[1] - settings.current.margin
+        above = [position for position in positions if position[1] < bottom]
+        if not above:
+            return x
+        target_x, _ = max(above, key=lambda position: position[1])
+        if mode == 0:
+            # Step far enough aside, towards the roomier side:
+            if abs(target_x - x) > 150:
+                return x
+            return target_x + 200 if target_x < settings.current.screen_size[0] // 2 else target_x - 200
+        return target_x
+    return play
+
+
+PLAYERS = {'random': random_player, 'scripted': scripted_player}
+
+
+def run_game(task):
+    """
+    Plays one headless game with the config overrides of the task, and
+    returns its results. Runs in a worker process.
+    """
+    overrides, mode, player, seed, max_ticks = task
+    saved = settings.current
+    settings.use(saved.replace(**overrides))
+    # Sprites left over from another task may have been set up with
+    # other settings:
+    pool.sprites.clear()
+    try:
+        env = sim.Env(mode, seed)
+        play = PLAYERS[player](mode, seed)
+        observation = env.observe()
+        done = False
+        while not done and env.ticks < max_ticks:
+            _, done = env.step(play(observation))
+            observation = env.observe()
+        level = env.level
+        result = dict(overrides, mode=mode, player=player, seed=seed,
+                      survival=env.ticks / settings.current.tick_rate,
+                      score=level.score, level=level.number)
+    finally:
+        settings.use(saved)
+        pool.sprites.clear()
+    return result
+
+
+def grid(choices):
+    """
+    Turns a list of 'name=value,value,...' strings into a list of
+    config override dicts, one for every combination of the values.
+    Values are Python literals (anything else is taken as a string).
+    Only settings that are read when a level is set up or played have
+    an effect (e.g., not the sizes of the images).
+    """
+    names = []
+    values = []
+    for choice in choices:
+        name, _, options = choice.partition('=')
+        if name not in settings.FIELDS:
+            raise SystemExit('config has no setting named {!r}'.format(name))
+        names.append(name)
+        values.append([literal(option) for option in options.split(',')])
+    combinations = [dict(zip(names, combination)) for combination in itertools.product(*values)]
+    # Check the values before any game is played:
+    for overrides in combinations:
+        try:
+            settings.current.replace(**overrides)
+        except ValueError as error:
+            raise SystemExit(str(error))
+    return combinations
+
+
+def literal(text):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Run headless Squish games over a grid of config settings.')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=V1,V2,...',
+                        help='values to try for a config setting (may be repeated)')
+    parser.add_argument('--mode', type=int, action='append', help='game modes to play (default: 0 and 1)')
+    parser.add_argument('--player', action='append', choices=sorted(PLAYERS),
+                        help='players to use (default: all)')
+    parser.add_argument('--games', type=int, default=10, help='games (seeds) for every combination')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--max-seconds', type=float, default=120, help='game time before a game is stopped')
+    parser.add_argument('--processes', type=int, help='worker processes (default: one per core)')
+    parser.add_argument('--out', help='CSV file for the results (default: standard output)')
+    options = parser.parse_args(args)
+
+    combinations = grid(options.set)
+    max_ticks = int(options.max_seconds * settings.current.tick_rate)
+    tasks = [(overrides, mode, player, options.seed + game, max_ticks)
+             for overrides in combinations
+             for mode in options.mode or [0, 1]
+             for player in options.player or sorted(PLAYERS)
+             for game in range(options.games)]
+
+    with multiprocessing.Pool(options.processes) as workers:
+        # Ordered by task (not by completion), so a sweep is reproducible:
+        results = workers.map(run_game, tasks, chunksize=1)
+
+    file = open(options.out, 'w', newline='') if options.out else sys.stdout
+    try:
+        writer = csv.DictWriter(file, list(combinations[0]) + FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+    finally:
+        if options.out:
+            file.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())